@@ -0,0 +1,180 @@
+import os
+import numpy as np
+import pandas as pd
+from data_preprocessing import checkpoint_columns
+from filter_engine import NS_PER_HOUR, datetime_matrix, take_rows
+from filter_cache import FilterCache, filter_key
+
+# Edges of duration histogram bins in hours, the last bin also counts longer durations
+duration_bins = np.arange(0, 4.25, 0.25)
+
+# Number of the most frequent transitions that duration histograms show
+histogram_transitions = 5
+
+# Cache of aggregates of filtered visitors, e.g. AGGREGATE_CACHE_MB=64
+aggregate_cache = FilterCache(max_bytes=int(float(os.environ.get("AGGREGATE_CACHE_MB", 32)) * 2 ** 20), ttl=15 * 60)
+
+def checkpoint_transitions(filtered):
+    """
+    Find transitions between consecutive checkpoints of each visitor in one pass over the checkpoint datetime matrix
+    sorted within each visitor. Checkpoints at the same datetime keep the order of checkpoint_columns.
+    Return (visitor, from checkpoint, to checkpoint, start in int64 nanoseconds, duration in hours) arrays of transitions.
+    """
+
+    values, nat = datetime_matrix(filtered, checkpoint_columns)
+
+    # Missing checkpoints are sorted last, so checkpoints of each visitor that exist are a prefix of its row
+    missing = np.iinfo(np.int64).max
+    values = np.where(nat, missing, values)
+    order = np.argsort(values, axis=1, kind="stable")
+    values = np.take_along_axis(values, order, axis=1)
+
+    visitors, steps = np.nonzero(values[:, 1:] != missing)
+    starts = values[visitors, steps]
+
+    return visitors, order[visitors, steps], order[visitors, steps + 1], starts, (values[visitors, steps + 1] - starts) / NS_PER_HOUR
+
+def group_quantiles(groups, values, count, quantiles):
+    """
+    Compute quantiles of values of each group 0..count - 1 with linear interpolation like pandas quantile.
+    Values are ordered by group once and only the values around each quantile are partitioned, so no group is sorted.
+    Return groups that have values and (groups, quantiles) matrix.
+    """
+
+    # Stable sort of 16-bit groups is a radix sort
+    order = np.argsort(groups.astype(np.uint16) if count <= 2 ** 16 else groups, kind="stable")
+    values = values[order]
+
+    sizes = np.bincount(groups, minlength=count)
+    firsts = np.cumsum(sizes) - sizes
+    present = np.flatnonzero(sizes)
+
+    result = np.empty((len(present), len(quantiles)))
+    for index, group in enumerate(present):
+        position = np.array(quantiles) * (sizes[group] - 1)
+        lower = np.floor(position).astype(np.int64)
+        upper = np.minimum(lower + 1, sizes[group] - 1)
+        part = np.partition(values[firsts[group]:firsts[group] + sizes[group]], np.union1d(lower, upper))
+        result[index] = part[lower] + (part[upper] - part[lower]) * (position - lower)
+
+    return present, result
+
+def flow_aggregates(filtered):
+    """
+    Aggregate transitions between checkpoints of filtered visitors into transition matrix, duration histogram
+    of each transition and median and 90th percentile duration of transitions per clinic and hour of day.
+    """
+
+    visitors, sources, targets, starts, durations = checkpoint_transitions(filtered)
+    checkpoints = len(checkpoint_columns)
+    transitions = sources * checkpoints + targets
+
+    bins = np.clip(np.searchsorted(duration_bins, durations, side="right") - 1, 0, len(duration_bins) - 1)
+    histograms = np.bincount(transitions * len(duration_bins) + bins, minlength=checkpoints * checkpoints * len(duration_bins))
+
+    # Quantiles of each clinic and hour in order of clinic categories and hours, visitors without clinic are left out
+    clinic = filtered["clinic"]
+    codes = clinic.cat.codes.to_numpy()[visitors].astype(np.int64)
+    hours = (starts // NS_PER_HOUR) % 24
+    known = codes >= 0
+    groups, quantiles = group_quantiles(codes[known] * 24 + hours[known], durations[known], len(clinic.cat.categories) * 24, [0.5, 0.9])
+    clinic_hour = pd.DataFrame(quantiles, columns=[0.5, 0.9], index=pd.MultiIndex.from_arrays(
+        [pd.Categorical.from_codes(groups // 24, clinic.cat.categories), groups % 24], names=["clinic", "hour"]))
+
+    return {
+        "transitions": np.bincount(transitions, minlength=checkpoints * checkpoints).reshape(checkpoints, checkpoints),
+        "histograms": histograms.reshape(checkpoints * checkpoints, len(duration_bins)),
+        "clinic_hour": clinic_hour
+    }
+
+def aggregates_nbytes(aggregates):
+    """
+    Count bytes of aggregates for aggregate_cache.
+    """
+
+    return aggregates["transitions"].nbytes + aggregates["histograms"].nbytes + int(aggregates["clinic_hour"].memory_usage().sum())
+
+def cached_flow_aggregates(dataset, state, positions):
+    """
+    Aggregate filtered visitors at row positions, cached by filter state.
+    Requests of the same filter state at once share one aggregation.
+    """
+
+    key = filter_key(["flow", state], dataset.get("version"))
+
+    return aggregate_cache.get_or_compute(
+        key, lambda: flow_aggregates(take_rows(dataset["visits"], positions, checkpoint_columns + ["clinic"])), size=aggregates_nbytes)
+
+def transition_figure(aggregates):
+    """
+    Generate heatmap figure of number of visitors moving from each checkpoint to the next.
+    """
+
+    return {
+        "data": [{
+            "type": "heatmap",
+            "z": aggregates["transitions"].tolist(),
+            "x": checkpoint_columns,
+            "y": checkpoint_columns,
+            "colorscale": "Blues",
+            "hovertemplate": "%{y} → %{x}: %{z} visitors<extra></extra>"
+        }],
+        "layout": {
+            "title": "Transitions between checkpoints",
+            "xaxis": {"title": "To"},
+            "yaxis": {"title": "From", "autorange": "reversed"},
+            "margin": {"l": 100, "b": 80}
+        }
+    }
+
+def duration_figure(aggregates):
+    """
+    Generate figure of duration histograms of the most frequent transitions.
+    """
+
+    counts = aggregates["transitions"].ravel()
+    top = [index for index in np.argsort(-counts, kind="stable")[:histogram_transitions] if counts[index] > 0]
+    checkpoints = len(checkpoint_columns)
+
+    return {
+        "data": [{
+            "type": "bar",
+            "name": f"{checkpoint_columns[index // checkpoints]} → {checkpoint_columns[index % checkpoints]}",
+            "x": duration_bins.tolist(),
+            "y": aggregates["histograms"][index].tolist(),
+            "offset": 0,
+            "width": float(duration_bins[1] - duration_bins[0])
+        } for index in top],
+        "layout": {
+            "title": "Time between consecutive checkpoints (hrs)",
+            "barmode": "overlay",
+            "xaxis": {"title": f"Hours, last bin includes {duration_bins[-1]:g} hours or more"},
+            "yaxis": {"title": "Visitors"}
+        }
+    }
+
+def clinic_hour_figure(aggregates):
+    """
+    Generate heatmap figure of median time between consecutive checkpoints per clinic and hour with 90th percentile on hover.
+    """
+
+    stats = aggregates["clinic_hour"]
+    median = stats[0.5].unstack() if len(stats) > 0 else pd.DataFrame()
+    p90 = stats[0.9].unstack().reindex_like(median) if len(stats) > 0 else pd.DataFrame()
+
+    return {
+        "data": [{
+            "type": "heatmap",
+            "z": median.to_numpy().tolist(),
+            "x": median.columns.tolist(),
+            "y": median.index.astype(str).tolist(),
+            "customdata": p90.to_numpy().tolist(),
+            "colorscale": "Reds",
+            "hovertemplate": "%{y}, %{x}:00<br>median %{z:.2f} hrs<br>p90 %{customdata:.2f} hrs<extra></extra>"
+        }],
+        "layout": {
+            "title": "Median time between consecutive checkpoints per clinic and hour (hrs)",
+            "xaxis": {"title": "Hour", "dtick": 1},
+            "margin": {"l": 150}
+        }
+    }
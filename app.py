@@ -2,6 +2,12 @@ import dash
 from data_preprocessing import load_data
 from filter_layout import filter_layout
 import filter_callbacks
+import os
+from data_reload import register_admin_endpoint, start_watcher
+from filter_pool import start_pool
+from metrics import register_metrics_endpoint
+from sql_backend import attach_database
+from aggregates import aggregate_cache
 
 external_stylesheets = ["https://codepen.io/chriddyp/pen/bWLwgP.css"]
 
@@ -9,17 +15,42 @@ app = dash.Dash(__name__,
                 external_stylesheets=external_stylesheets,
                 suppress_callback_exceptions=True)
 
+# Flask server for WSGI servers, e.g. gunicorn app:server
+server = app.server
+
 filename = "../data/sample-data-1-7Mar.xlsx"
-days = load_data(filename)
+dataset = load_data(filename)
+
+# Query visitors in SQLite database of the store instead of in memory, e.g. QUERY_BACKEND=sqlite python app.py
+if os.environ.get("QUERY_BACKEND") == "sqlite":
+    attach_database(dataset)
+
+# Filter visitors of each date in pool of processes or threads, e.g. FILTER_WORKERS=4 FILTER_MODE=thread python app.py
+if os.environ.get("FILTER_WORKERS"):
+    start_pool(int(os.environ["FILTER_WORKERS"]), os.environ.get("FILTER_MODE", "process"))
+
+# Layout is generated on every page load, so date picker bounds follow reloaded datasets
+app.layout = lambda: filter_layout(dict(dataset))
+
+# Reload new sheets of the workbook without restarting, by admin endpoint or by watching the workbook,
+# e.g. ADMIN_TOKEN=secret RELOAD_INTERVAL=300 python app.py
+# With several workers, RELOAD_INTERVAL also makes every worker pick up a reload that the admin endpoint ran in one of them
+register_admin_endpoint(server, dataset, filename)
 
-app.layout = filter_layout(days)
+# Prometheus metrics of stage timings and caches, e.g. curl host/metrics
+register_metrics_endpoint(server, caches={"positions": filter_callbacks.cache,
+                                          "masks": filter_callbacks.mask_cache,
+                                          "summaries": filter_callbacks.summary_cache,
+                                          "aggregates": aggregate_cache})
+if os.environ.get("RELOAD_INTERVAL"):
+    start_watcher(dataset, filename, interval=float(os.environ["RELOAD_INTERVAL"]))
 
 # Call all callback functions from filter_callbacks.py
 for i in dir(filter_callbacks):
     item = getattr(filter_callbacks, i)
     
     if callable(item) and i.startswith("callback_"):
-        item(app, days)
+        item(app, dataset)
 
 if __name__ == "__main__":
     app.run_server(host="0.0.0.0", debug=True)
\ No newline at end of file
@@ -0,0 +1,108 @@
+// Clientside callbacks of filter_callbacks.py that only update UI options and never touch the data
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    filter: {
+        /*
+         * Update items in checkpoints ordering dropdown.
+         */
+        update_checkpoints_ordering_dropdown: function(datetime_columns, datetime_columns_id) {
+            const checkpoints = [];
+
+            datetime_columns_id.forEach(function(id, index) {
+                if (datetime_columns[index] === 1) {
+                    checkpoints.push({"label": id["index"], "value": id["index"]});
+                }
+            });
+
+            return checkpoints;
+        },
+
+        /*
+         * Update checkpoints ordering radioItems if there is no any checkpoint in dropdown, disable radioItems.
+         */
+        update_checkpoints_ordering_radioItems: function(checkpoints) {
+            const disabled = checkpoints == null || checkpoints.length <= 1;
+            const options = [{"label": "ใช่", "value": 1},
+                             {"label": "ไม่ใช่", "value": 0}];
+
+            if (disabled) {
+                options.forEach(function(option) {
+                    option["disabled"] = true;
+                });
+            }
+
+            return [options, 1];
+        },
+
+        /*
+         * Update all datetime columns radioItems by "all-datetime-columns" radioItems.
+         */
+        update_all_datetime_columns_radioItems: function(all_datetime) {
+            const total_radioItems = 10;
+            const options = [
+                {"label": "มี / ไม่มี", "value": 2},
+                {"label": "มี", "value": 1},
+                {"label": "ไม่มี", "value": 0}
+            ];
+
+            if (all_datetime !== 2) {
+                options.forEach(function(option) {
+                    option["disabled"] = true;
+                });
+            }
+
+            return [Array(total_radioItems).fill(options), Array(total_radioItems).fill(all_datetime)];
+        },
+
+        /*
+         * Update options in start and end dropdown of time between checkpoints dropdown.
+         */
+        update_time_between_checkpoints_dropdown: function(checkpoints, start_checkpoint, end_checkpoint,
+                                                           start_checkpoints, end_checkpoints, dropdown_id) {
+            /*
+             * Generate options for each checkpoint dropdown.
+             * Remove the opposite checkpoint and checkpoints that are already paired with it in other divisions.
+             */
+            function generate_checkpoint_dropdowns(checkpoints, opposite_checkpoint) {
+                function remove(checkpoint) {
+                    checkpoints = checkpoints.filter(function(option) {
+                        return option["value"] !== checkpoint;
+                    });
+                }
+
+                if (opposite_checkpoint != null) {
+                    remove(opposite_checkpoint);
+
+                    start_checkpoints.forEach(function(value, index) {
+                        if (index === dropdown_id["index"]) {
+                            return;
+                        }
+
+                        if (start_checkpoints[index] === opposite_checkpoint) {
+                            remove(end_checkpoints[index]);
+                        }
+
+                        if (end_checkpoints[index] === opposite_checkpoint) {
+                            remove(start_checkpoints[index]);
+                        }
+                    });
+                }
+
+                return checkpoints;
+            }
+
+            function contains(dropdown, checkpoint) {
+                return dropdown.some(function(option) {
+                    return option["value"] === checkpoint;
+                });
+            }
+
+            const start_dropdown = generate_checkpoint_dropdowns((checkpoints || []).slice(), end_checkpoint);
+            const end_dropdown = generate_checkpoint_dropdowns((checkpoints || []).slice(), start_checkpoint);
+
+            const start_value = contains(start_dropdown, start_checkpoint) ? start_checkpoint : null;
+            const end_value = contains(end_dropdown, end_checkpoint) ? end_checkpoint : null;
+
+            return [start_dropdown, end_dropdown, start_value, end_value];
+        }
+    }
+});
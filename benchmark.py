@@ -0,0 +1,122 @@
+import argparse
+import timeit
+import numpy as np
+import pandas as pd
+from data_preprocessing import checkpoint_columns
+from filter_engine import time_between_checkpoints_mask, checkpoints_ordering_mask
+
+def generate_checkpoints(rows, seed=0):
+    """
+    Generate random checkpoint datetime columns with missing values.
+    """
+
+    rng = np.random.default_rng(seed)
+    visit_dt = pd.Timestamp("2021-03-01 06:00") + pd.to_timedelta(rng.integers(0, 10 * 3600, rows), unit="s")
+
+    checkpoints = dict()
+    current = pd.Series(visit_dt)
+    for col in checkpoint_columns:
+        current = current + pd.to_timedelta(rng.integers(0, 3600, rows), unit="s")
+        checkpoints[col] = current.where(rng.random(rows) > 0.2)
+
+    # Some visitors pass doctor begin checkpoint before doctor call checkpoint
+    checkpoints["doc_begin_dt"] = checkpoints["doc_begin_dt"].where(rng.random(rows) > 0.1,
+                                                                    checkpoints["doc_begin_dt"] - pd.Timedelta(hours=2))
+
+    return pd.DataFrame(checkpoints)
+
+def time_between_checkpoints_apply(filtered, start_checkpoints, end_checkpoints, min_btw, max_btw):
+    """
+    Row-wise time between checkpoints filter that was used before filter_engine.
+    """
+
+    def generate_time_btw(columns):
+        if pd.isnull(columns[0]) or pd.isnull(columns[1]):
+            return np.nan
+
+        return abs((columns[0] - columns[1]) / np.timedelta64(1, 'h'))
+
+    for index in range(max(len(start_checkpoints), len(end_checkpoints))):
+        if start_checkpoints[index] == None or end_checkpoints[index] == None:
+            continue
+
+        time_btw = filtered[[start_checkpoints[index], end_checkpoints[index]]].apply(lambda columns: generate_time_btw(columns),
+                                                                                      axis=1)
+        if len(filtered) > 0:
+            filtered = filtered[(time_btw >= min_btw[index]) & (time_btw < max_btw[index]) | (time_btw.isna())]
+
+    return filtered
+
+def checkpoints_ordering_apply(filtered, checkpoints):
+    """
+    Row-wise checkpoints ordering check that was used before filter_engine.
+    """
+
+    def order_checkpoints(columns, checkpoints):
+        sequence = []
+        for index in range(len(columns)):
+            if not pd.isnull(columns[index]):
+                sequence.append((checkpoints[index], columns[index]))
+
+        sequence = sorted(sequence, key=(lambda x: x[1]))
+        sequence = list(map(lambda x: x[0], sequence))
+
+        sequence_index = []
+        for checkpoint in checkpoints:
+            if checkpoint in sequence:
+                sequence_index.append(sequence.index(checkpoint))
+
+        return sorted(sequence_index) == sequence_index
+
+    return filtered[checkpoints].apply(lambda columns: order_checkpoints(columns, checkpoints), axis=1).to_numpy(dtype=bool)
+
+def compare(label, sizes, repeat, apply_path, vectorized_path, check):
+    """
+    Print timing of apply-based and vectorized paths for each number of rows.
+    """
+
+    print(label)
+    print(f"{'rows':>10} {'apply (s)':>12} {'vectorized (s)':>16} {'speedup':>10}")
+    for rows in sizes:
+        frame = generate_checkpoints(rows)
+        assert check(apply_path(frame), vectorized_path(frame)), "vectorized path returns different result"
+
+        apply_time = min(timeit.repeat(lambda: apply_path(frame), number=1, repeat=repeat))
+        vectorized_time = min(timeit.repeat(lambda: vectorized_path(frame), number=1, repeat=repeat))
+
+        print(f"{rows:>10} {apply_time:>12.4f} {vectorized_time:>16.4f} {apply_time / vectorized_time:>9.1f}x")
+
+def benchmark_time_between_checkpoints(sizes, repeat):
+    """
+    Compare apply-based and vectorized time between checkpoints filters.
+    """
+
+    rules = [("kios_dt", "doc_call_dt", 0, 2),
+             ("screen_dt", "payment_dt", 0, 3),
+             ("doc_call_dt", "pharmacy_dt", 1, 4)]
+
+    compare("Time between checkpoints", sizes, repeat,
+            lambda frame: time_between_checkpoints_apply(frame, *map(list, zip(*rules))),
+            lambda frame: frame[time_between_checkpoints_mask(frame, rules)],
+            lambda expected, result: expected.index.equals(result.index))
+
+def benchmark_checkpoints_ordering(sizes, repeat):
+    """
+    Compare apply-based and vectorized checkpoints ordering checks.
+    """
+
+    checkpoints = ["screen_dt", "doc_begin_dt", "doc_call_dt", "payment_dt"]
+
+    compare("Checkpoints ordering", sizes, repeat,
+            lambda frame: checkpoints_ordering_apply(frame, checkpoints),
+            lambda frame: checkpoints_ordering_mask(frame, checkpoints),
+            np.array_equal)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark filter engine against apply-based filters.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    benchmark_time_between_checkpoints(args.sizes, args.repeat)
+    benchmark_checkpoints_ordering(args.sizes, args.repeat)
@@ -0,0 +1,202 @@
+import argparse
+import json
+import os
+import platform
+import tempfile
+import time
+from datetime import date, timedelta
+import numpy as np
+from data_preprocessing import load_data, checkpoint_columns
+from synthetic_data import write_workbook, clinics, final_statuses
+import filter_callbacks
+
+class CallbackRecorder:
+    """
+    Stand-in for Dash app that keeps callback functions, so they can be called without a server.
+    """
+
+    def __init__(self):
+        self.callbacks = dict()
+
+    def callback(self, *args, **kwargs):
+        def register(function):
+            self.callbacks[function.__name__] = function
+            return function
+
+        return register
+
+    def clientside_callback(self, *args, **kwargs):
+        pass
+
+def default_filters(dataset):
+    """
+    Generate filter fields of a new page, i.e. every visitor of every date.
+    """
+
+    return {
+        "start_date": min(dataset["dates"]).isoformat(), "end_date": max(dataset["dates"]).isoformat(),
+        "gender": ["M", "F"], "final_status": list(final_statuses), "appointment": [1, 0],
+        "min_age": 0, "max_age": 100, "min_start_time": 0, "max_start_time": 24,
+        "min_total_time": 0, "max_total_time": 24, "clinics": list(dataset["clinics"]),
+        "checkpoints": None, "isOrdered": 1, "start_checkpoints": [], "end_checkpoints": [],
+        "min_btw": [], "max_btw": [], "datetime_columns": [2] * len(checkpoint_columns),
+        "datetime_columns_id": [{"type": "datetime-column-radioItems", "index": col} for col in checkpoint_columns]
+    }
+
+def filter_mixes(dataset):
+    """
+    Generate representative filter fields that together cover every filter path.
+    """
+
+    first_date = min(dataset["dates"])
+    mixes = {name: default_filters(dataset) for name in ["all", "one_day", "one_week", "demographics", "time_ranges",
+                                                          "presence", "between_checkpoints", "ordering", "everything"]}
+
+    mixes["one_day"].update(end_date=first_date.isoformat())
+    mixes["one_week"].update(end_date=min(first_date + timedelta(days=6), max(dataset["dates"])).isoformat())
+    mixes["demographics"].update(gender=["F"], final_status=final_statuses[:2], appointment=[1],
+                                 clinics=list(clinics.values())[:10])
+    mixes["time_ranges"].update(min_age=20, max_age=60, min_start_time=8, max_start_time=12,
+                                min_total_time=1, max_total_time=4)
+    mixes["presence"].update(datetime_columns=[2, 1, 1, 2, 1, 1, 2, 0, 2, 2])
+    mixes["between_checkpoints"].update(start_checkpoints=["kios_dt", "screen_dt"], end_checkpoints=["doc_call_dt", "payment_dt"],
+                                        min_btw=[0, 1], max_btw=[2, 4])
+    mixes["ordering"].update(checkpoints=["screen_dt", "doc_call_dt", "doc_begin_dt", "payment_dt"], isOrdered=1)
+    mixes["everything"].update(gender=["M"], appointment=[0], min_age=30, max_age=80, min_start_time=7, max_start_time=14,
+                               datetime_columns=[2, 1, 2, 2, 1, 2, 2, 2, 1, 2],
+                               start_checkpoints=["kios_dt"], end_checkpoints=["doc_call_dt"], min_btw=[0], max_btw=[3],
+                               checkpoints=["screen_dt", "doc_call_dt", "payment_dt"], isOrdered=1)
+
+    return mixes
+
+def clear_caches():
+    """
+    Clear every result cache, so the next call filters again.
+    """
+
+    for cache in [filter_callbacks.cache, filter_callbacks.mask_cache, filter_callbacks.summary_cache]:
+        cache.clear()
+
+def measure(function, repeat, before=None):
+    """
+    Call function repeat times and return its best and median seconds, before is called before each call.
+    """
+
+    seconds = []
+    for _ in range(repeat):
+        if before is not None:
+            before()
+        start = time.perf_counter()
+        function()
+        seconds.append(time.perf_counter() - start)
+
+    return {"best": min(seconds), "median": float(np.median(seconds))}
+
+def peak_memory():
+    """
+    Return peak resident memory of the process in bytes or None if it is not available.
+    """
+
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Linux reports kilobytes, macOS reports bytes
+    return peak if platform.system() == "Darwin" else peak * 1024
+
+def dataset_memory(dataset):
+    """
+    Count bytes of visits, cube and range indexes of dataset.
+    """
+
+    return {
+        "visits": int(dataset["visits"].memory_usage(index=False, deep=True).sum()),
+        "cube": int(dataset["cube"].memory_usage(index=False, deep=True).sum()),
+        "range_indexes": int(sum(order.nbytes + values.nbytes for order, values in dataset["range_indexes"].values()))
+    }
+
+def run(filename, repeat):
+    """
+    Time load_data, filter_data_by_date and update_data_table of every filter mix and return results.
+    Store of the workbook is built in a temporary directory, so the store next to the workbook is not touched.
+    """
+
+    results = {"filename": filename, "repeat": repeat, "load_data": dict(), "filters": dict()}
+
+    with tempfile.TemporaryDirectory() as store_dir:
+        # Ingest from workbook into an empty store and then map the store
+        start = time.perf_counter()
+        dataset = load_data(filename, store_dir)
+        results["load_data"]["ingest"] = time.perf_counter() - start
+        results["load_data"]["store"] = measure(lambda: load_data(filename, store_dir), repeat)
+        results["visitors"] = len(dataset["visits"])
+        results["days"] = len(dataset["dates"])
+
+        app = CallbackRecorder()
+        filter_callbacks.callback_data_table(app, dataset)
+        update_data_table = app.callbacks["update_data_table"]
+
+        for name, filters in filter_mixes(dataset).items():
+            rows = len(filter_callbacks.filter_data_by_date(dataset, filters["start_date"], filters["end_date"]))
+            table_filters = dict(filters, page_current=0, page_size=5, sort_by=[], session=None)
+
+            by_date = measure(lambda: filter_callbacks.filter_data_by_date(dataset, filters["start_date"], filters["end_date"]), repeat)
+            cold = measure(lambda: update_data_table(**table_filters), repeat, before=clear_caches)
+            warm = measure(lambda: update_data_table(**table_filters), repeat)
+            sorted_page = measure(lambda: update_data_table(**dict(table_filters, sort_by=[{"column_id": "age", "direction": "desc"}])),
+                                  repeat, before=clear_caches)
+
+            results["filters"][name] = {
+                "rows": rows,
+                "filtered": len(filter_callbacks.filter_positions(dataset, filter_callbacks.filter_state(**filters))),
+                "filter_data_by_date": by_date,
+                "update_data_table": cold,
+                "update_data_table_cached": warm,
+                "update_data_table_sorted": sorted_page,
+                "rows_per_second": rows / cold["best"] if cold["best"] > 0 else None
+            }
+
+        results["memory"] = dict(dataset_memory(dataset), peak_rss=peak_memory())
+
+    return results
+
+def print_results(results):
+    """
+    Print results as a table.
+    """
+
+    print(f"{results['visitors']} visitors in {results['days']} days")
+    print(f"load_data: ingest {results['load_data']['ingest']:.3f} s, store {results['load_data']['store']['best']:.4f} s")
+    print(f"{'filter':>20} {'rows':>10} {'filtered':>10} {'by date (ms)':>13} {'table (ms)':>11} {'cached (ms)':>12} "
+          f"{'sorted (ms)':>12} {'rows/s':>12}")
+    for name, result in results["filters"].items():
+        print(f"{name:>20} {result['rows']:>10} {result['filtered']:>10} {result['filter_data_by_date']['best'] * 1000:>13.3f} "
+              f"{result['update_data_table']['best'] * 1000:>11.2f} {result['update_data_table_cached']['best'] * 1000:>12.2f} "
+              f"{result['update_data_table_sorted']['best'] * 1000:>12.2f} {result['rows_per_second']:>12.0f}")
+    print("memory (MB): " + ", ".join(f"{key} {value / 2 ** 20:.1f}" for key, value in results["memory"].items() if value is not None))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark loading and filtering of synthetic visitors.")
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--visitors", type=int, default=3000, help="visitors per day")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workbook", help="workbook to benchmark, generated if it does not exist")
+    parser.add_argument("--output", help="JSON file to save results, e.g. to track regressions between commits")
+    args = parser.parse_args()
+
+    filename = args.workbook or f"synthetic-{args.days}x{args.visitors}-{args.seed}.xlsx"
+    if not os.path.exists(filename):
+        write_workbook(filename, date(2021, 3, 1), args.days, args.visitors, args.seed)
+
+    results = run(filename, args.repeat)
+    results.update(days_requested=args.days, visitors_per_day=args.visitors, seed=args.seed,
+                   python=platform.python_version(), created=time.strftime("%Y-%m-%dT%H:%M:%S"))
+    print_results(results)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2, default=str)
@@ -0,0 +1,83 @@
+import itertools
+import os
+import threading
+import time
+from concurrent.futures import CancelledError
+from contextlib import contextmanager
+
+# Seconds that a request waits for a newer request of the same session before it computes, e.g. DEBOUNCE_SECONDS=0.2
+debounce_seconds = float(os.environ.get("DEBOUNCE_SECONDS", 0.15))
+
+# Generation of the latest request of each (session, callback)
+latest = dict()
+
+# Number of requests of each (session, callback) that are in flight
+running = dict()
+generations = itertools.count()
+lock = threading.Lock()
+
+# Request that runs on the current thread
+local = threading.local()
+
+class Superseded(CancelledError):
+    """
+    Raised in a request when a newer request of the same session and callback has arrived.
+    """
+
+def is_superseded():
+    """
+    Check whether request of the current thread has been superseded by a newer request.
+    """
+
+    request = getattr(local, "request", None)
+    if request is None:
+        return False
+
+    return latest.get(request[0]) != request[1]
+
+def checkpoint():
+    """
+    Stop request of the current thread if it has been superseded, called between stages of filtering.
+    """
+
+    if is_superseded():
+        raise Superseded()
+
+@contextmanager
+def latest_request(session, name, wait=True):
+    """
+    Run request of callback name as the latest request of session, e.g.
+    with latest_request(session, "update_data_table"): ...
+    Request that arrives while an older request of the same session is in flight waits debounce_seconds first,
+    so a burst of edits computes only the last one, unless wait is False, e.g. when its result is cached.
+    Request stops at the next checkpoint when a newer request arrives. Requests without session are never superseded.
+    Requests are tracked in the memory of each process, so with several gunicorn workers only requests of a session
+    that reach the same worker supersede each other.
+    """
+
+    if session is None:
+        yield
+        return
+
+    key = (session, name)
+    with lock:
+        generation = next(generations)
+        latest[key] = generation
+        busy = running.get(key, 0) > 0
+        running[key] = running.get(key, 0) + 1
+
+    parent = getattr(local, "request", None)
+    local.request = (key, generation)
+    try:
+        if wait and busy and debounce_seconds > 0:
+            time.sleep(debounce_seconds)
+        checkpoint()
+        yield
+    finally:
+        local.request = parent
+        with lock:
+            running[key] -= 1
+            if running[key] == 0:
+                del running[key]
+            if latest.get(key) == generation:
+                del latest[key]
@@ -1,38 +1,269 @@
+import itertools
 import pandas as pd
+import numpy as np
 from datetime import date
+from data_store import source_key, default_store_dir, read_store, write_chunks, mark_store_in_use
+from metrics import trace, stage
 
-def load_data(filename):
+# Column names in English
+data_columns = ["vn", "gender", "age", "visit_dt", "clinic_code", "clinic",
+                "kios_g_dt", "kios_dt", "screen_dt", "send_doc_dt",
+                "doc_call_dt", "doc_begin_dt", "doc_submit_dt", "nurse_dt",
+                "payment_dt", "pharmacy_dt", "final_status"]
+
+# Datetime columns of checkpoints that visitors pass, bit i of "checkpoints_mask" is checkpoint_columns[i]
+checkpoint_columns = [col for col in data_columns if col.endswith("_dt") and col != "visit_dt"]
+
+# Low-cardinality string columns that are stored as categorical codes
+categorical_columns = ["gender", "clinic_code", "clinic", "final_status"]
+
+# Compact schema costs about 124 bytes per visitor, i.e. about 124 MB per million visits
+# (vn 4, gender 1, age 1, visit_dt 8, clinic_code 1, clinic 1, 10 checkpoints 80, final_status 1,
+# start_time 8, end_time 8, total_time 4, start_hour 4, is_appointment 1, checkpoints_mask 2),
+# compared with about 380 bytes per visitor with object strings and 64-bit numbers.
+# Category codes grow to 2 bytes when a column has more than 127 distinct values.
+# Sorted indexes of range filters add about 21 bytes per visitor (4 bytes of order and the column value each).
+# Counts of checkpoints_mask patterns add 8 KB per date (1024 patterns of 10 checkpoints).
+
+# Columns of range filters that have sorted indexes
+range_index_columns = ["age", "start_hour", "total_time"]
+
+def add_derived_columns(day):
+    """
+    Add per-visitor columns that filters use, so they are computed only once at load time.
+    """
+    
+    checkpoints = day[checkpoint_columns]
+    
+    day["start_time"] = checkpoints.min(axis=1)
+    day["end_time"] = checkpoints.max(axis=1)
+    day["total_time"] = (day["end_time"] - day["start_time"]) / np.timedelta64(1, 'h')
+    day["start_hour"] = day["start_time"].dt.hour
+    day["is_appointment"] = (day["visit_dt"].dt.minute.isin([0, 30])) & (day["visit_dt"].dt.second == 0)
+    day["checkpoints_mask"] = (checkpoints.notna().to_numpy() @ (1 << np.arange(len(checkpoint_columns)))).astype(np.uint16)
+    
+    return day
+
+def compact_dtypes(visits):
+    """
+    Convert visits columns to compact dtypes.
+    """
+    
+    for col in categorical_columns:
+        visits[col] = visits[col].astype("category")
+    
+    for col in ["vn", "age"]:
+        visits[col] = pd.to_numeric(visits[col], downcast="integer")
+    
+    visits["total_time"] = visits["total_time"].astype(np.float32)
+    visits["start_hour"] = visits["start_hour"].astype(np.float32)
+    
+    return visits
+
+def build_cube(dataset):
     """
-    Load data from file and preprocess it.
+    Count visitors by date, start hour, clinic, gender, final status, appointment and checkpoints mask.
+    Rows of dataset["dates"][i] are dataset["cube"].iloc[dataset["cube_offsets"][i]:dataset["cube_offsets"][i + 1]].
+    Visitors without any checkpoint have no start hour and are not counted, as start time filter never selects them.
     """
     
-    # Load data
-    days = pd.read_excel(filename, sheet_name=None)
+    visits = dataset["visits"]
+    days = len(dataset["dates"])
+    day = np.repeat(np.arange(days), np.diff(dataset["offsets"]))
+    keys = pd.DataFrame({
+        "day": day,
+        "start_hour": visits["start_hour"],
+        "clinic": visits["clinic"],
+        "gender": visits["gender"],
+        "final_status": visits["final_status"],
+        "is_appointment": visits["is_appointment"],
+        "checkpoints_mask": visits["checkpoints_mask"]
+    })
+    cube = keys.groupby(list(keys.columns), observed=True, sort=True).size().rename("count").reset_index()
+    
+    # Minimum and maximum age of each date, NaN if some visitor of the date has no age, dates without visitors never exclude
+    ages = pd.Series(visits["age"].to_numpy(dtype="float64", na_value=np.nan)).groupby(day)
+    day_age_ranges = np.column_stack([ages.min().reindex(range(days), fill_value=np.inf).to_numpy(),
+                                      ages.max().reindex(range(days), fill_value=-np.inf).to_numpy()])
+    day_age_ranges[np.bincount(day[visits["age"].isna().to_numpy()], minlength=days) > 0] = np.nan
+    
+    return {
+        "cube": cube,
+        "cube_offsets": np.searchsorted(cube["day"].to_numpy(), np.arange(days + 1)),
+        # Cube covers age and total time filters only when their ranges contain every visitor of the selected dates
+        "day_age_ranges": day_age_ranges,
+        "total_time_range": (np.nanmin(visits["total_time"]), np.nanmax(visits["total_time"])) if len(visits) > 0 else (np.nan, np.nan)
+    }
+
+def build_range_indexes(dataset):
+    """
+    Build sorted index of each range filter column within each date.
+    Rows of dataset["dates"][i] sorted by col are order[offsets[i]:offsets[i + 1]] and their sorted values
+    are values[offsets[i]:offsets[i + 1]], where order, values = dataset["range_indexes"][col].
+    Missing values are sorted last.
+    """
+    
+    offsets = dataset["offsets"]
+    order_dtype = np.int32 if len(dataset["visits"]) < 2 ** 31 else np.int64
+    
+    range_indexes = dict()
+    for col in range_index_columns:
+        column = dataset["visits"][col].to_numpy()
+        order = np.empty(len(column), dtype=order_dtype)
+        for start, stop in zip(offsets[:-1], offsets[1:]):
+            order[start:stop] = np.argsort(column[start:stop], kind="stable") + start
+        range_indexes[col] = (order, column[order])
+    
+    return range_indexes
+
+def build_pattern_counts(dataset):
+    """
+    Count visitors of each date with each checkpoints_mask pattern.
+    Visitors of dataset["dates"][i] with pattern p are dataset["pattern_counts"][i, p].
+    """
+    
+    patterns = 1 << len(checkpoint_columns)
+    days = np.repeat(np.arange(len(dataset["dates"])), np.diff(dataset["offsets"]))
+    keys = days * patterns + dataset["visits"]["checkpoints_mask"].to_numpy()
+    
+    return np.bincount(keys, minlength=len(dataset["dates"]) * patterns).reshape(len(dataset["dates"]), patterns)
+
+def preprocess_sheet(sheet):
+    """
+    Validate, normalize and filter one sheet in one pass.
+    Return (sheet date, visitors of the sheet) or None if the sheet is not valid.
+    """
     
     # Change column names to English
-    for day in days.values():
-        day.columns = ["vn", "gender", "age", "visit_dt", "clinic_code", "clinic",
-                       "kios_g_dt", "kios_dt", "screen_dt", "send_doc_dt",
-                       "doc_call_dt", "doc_begin_dt", "doc_submit_dt", "nurse_dt",
-                       "payment_dt", "pharmacy_dt", "final_status"]
+    sheet.columns = data_columns
+    datetime_columns = [col for col in sheet.columns if col.endswith("_dt")]
+    
+    # Skip sheets that datetime columns don't contain only "datetime64[ns]" type
+    type = list(set([sheet[col].dtype for col in datetime_columns]))
+    if len(type) != 1 or str(type[0]) != 'datetime64[ns]':
+        return None
+    
+    # Sheet date is the date of visits
+    D = sheet["visit_dt"].dt.day.unique()[0]
+    M = sheet["visit_dt"].dt.month.unique()[0]
+    Y = sheet["visit_dt"].dt.year.unique()[0]
+    sheet_date = date(Y, M, D)
+    
+    # Remove visitors with datetime columns that contain different date from sheet date
+    same_date = np.ones(len(sheet), dtype=bool)
+    for col in datetime_columns:
+        same_date &= ((sheet[col].dt.day == sheet_date.day) | (sheet[col].isna())).to_numpy()
+    
+    return sheet_date, compact_dtypes(add_derived_columns(sheet[same_date].copy()))
+
+def read_sheets(filename, sheet_names=None):
+    """
+    Read and preprocess workbook one sheet at a time, yield (sheet date, visitors of the sheet) of valid sheets.
+    Only sheets in sheet_names are read if it is given.
+    """
+    
+    with pd.ExcelFile(filename) as workbook:
+        for sheet_name in workbook.sheet_names:
+            if sheet_names is not None and sheet_name not in sheet_names:
+                continue
+            result = preprocess_sheet(workbook.parse(sheet_name))
+            if result is not None:
+                yield result
+
+def read_sheet_names(filename):
+    """
+    Read names of all sheets of workbook without parsing them.
+    """
+    
+    with pd.ExcelFile(filename) as workbook:
+        return list(workbook.sheet_names)
+
+def prepare_dataset(dataset):
+    """
+    Add clinics, cube, checkpoints pattern counts and range indexes that callbacks use to dataset read from the store.
+    """
+    
+    # Keep the store while this process serves it, even if another worker writes a newer store
+    mark_store_in_use(dataset["store_dir"], dataset["version"])
+    
+    # All clinics of every date
+    dataset["clinics"] = dataset["visits"]["clinic"].cat.categories.tolist()
+    
+    # Cube of visitors for counting without filtering rows
+    with stage("cube") as info:
+        dataset.update(build_cube(dataset))
+        info["rows"] = len(dataset["cube"])
+    
+    # Visitors of each checkpoints pattern for counting checkpoint presence before filtering
+    dataset["pattern_counts"] = build_pattern_counts(dataset)
+    
+    # Sorted indexes for range filters
+    with stage("range_indexes") as info:
+        dataset["range_indexes"] = build_range_indexes(dataset)
+        info["rows"] = len(dataset["visits"])
+    
+    return dataset
+
+def load_data(filename, store_dir=None):
+    """
+    Load data from store of the file, stream sheets of workbook into the store if the store is outdated.
+    """
+    
+    if store_dir is None:
+        store_dir = default_store_dir(filename)
+    
+    with trace("load_data", inputs=filename):
+        with stage("source_key"):
+            key = source_key(filename)
         
-    # Delete sheets that datetime columns don't contain only "datetime64[ns]" type
-    for d in list(days.keys()):
-        type = list(set([days.get(d)[col].dtype for col in days.get(d).columns if col.endswith("_dt")]))
-        if len(type) != 1 or str(type[0]) != 'datetime64[ns]':
-            del days[d]
-
-    # Change "days" dictionary key names
-    for d, day in list(days.items()):
-        D = day["visit_dt"].dt.day.unique()[0]
-        M = day["visit_dt"].dt.month.unique()[0]
-        Y = day["visit_dt"].dt.year.unique()[0]
-        sheet_date = date(Y, M, D)
-        days[sheet_date] = days.pop(d)
+        with stage("read_store") as info:
+            dataset = read_store(store_dir, key)
+        if dataset is None:
+            with stage("ingest"):
+                write_chunks(read_sheets(filename), store_dir, key, sheets=read_sheet_names(filename))
+            with stage("read_store") as info:
+                dataset = read_store(store_dir, key)
+        info["rows"] = len(dataset["visits"])
+        
+        return prepare_dataset(dataset)
 
-    # Remove visitors with datetime columns that contain different date from sheet date
-    for d in days.keys():
-        for col in [col for col in days.get(d).columns if col.endswith("_dt")]:
-            days[d] = days.get(d)[(days.get(d)[col].dt.day == d.day) | (days.get(d)[col].isna())]
+def append_data(dataset, filename, store_dir=None):
+    """
+    Load data of the file into a new dataset, reading only sheets that are not in the store of dataset.
+    Visitors of dataset are copied from its store, so sheets that were already read are not parsed again.
+    Sheets that were already read and then edited are not read again, use load_data to read the whole file.
+    Return dataset unchanged if the file has not changed.
+    """
+    
+    if store_dir is None:
+        store_dir = default_store_dir(filename)
+    key = source_key(filename)
+    if key == dataset["version"]:
+        return dataset
+    
+    # Another worker may have written the store of the file already
+    stored = read_store(store_dir, key)
+    if stored is not None:
+        return prepare_dataset(stored)
+    
+    sheet_names = read_sheet_names(filename)
+    if dataset["sheets"] is None or not set(dataset["sheets"]).issubset(sheet_names):
+        # Store does not know its sheets or sheets were removed
+        return load_data(filename, store_dir)
+    
+    with trace("append_data", inputs=filename):
+        offsets = dataset["offsets"]
+        stored = ((d, dataset["visits"].iloc[offsets[index]:offsets[index + 1]]) for index, d in enumerate(dataset["dates"]))
+        new = read_sheets(filename, set(sheet_names).difference(dataset["sheets"]))
+        with stage("ingest"):
+            write_chunks(itertools.chain(stored, new), store_dir, key, sheets=sheet_names)
+        
+        return prepare_dataset(read_store(store_dir, key))
 
-    return days
\ No newline at end of file
+if __name__ == "__main__":
+    import sys
+    
+    # Ingest workbook into the store, e.g. python data_preprocessing.py ../data/sample-data-1-7Mar.xlsx
+    for filename in sys.argv[1:]:
+        dataset = load_data(filename)
+        print(f"{filename}: {len(dataset['visits'])} visitors in {len(dataset['dates'])} days")
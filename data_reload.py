@@ -0,0 +1,110 @@
+import hmac
+import logging
+import os
+import threading
+import time
+import flask
+from data_preprocessing import load_data, append_data
+from sql_backend import attach_database
+from data_store import latest_store, release_store, remove_unused_stores
+import filter_callbacks
+from aggregates import aggregate_cache
+
+# Only one reload runs at a time, callbacks keep serving the current dataset meanwhile
+reload_lock = threading.Lock()
+
+reload_log = logging.getLogger("data_reload")
+
+def swap_dataset(dataset, new):
+    """
+    Replace contents of dataset with new dataset in one step and drop results cached for the old dataset.
+    Callbacks take a snapshot of dataset with dict(dataset), which never mixes old and new contents.
+    """
+
+    old = dict(dataset)
+
+    # dict.update of string keys runs without releasing the GIL, so it is atomic for readers
+    dataset.update(new)
+
+    # The last worker that swaps out the old store removes it
+    if old.get("store_dir") is not None and old["version"] != new["version"]:
+        release_store(old["store_dir"], old["version"])
+        remove_unused_stores(new["store_dir"], new["version"])
+
+    for cache in [filter_callbacks.cache, filter_callbacks.mask_cache, filter_callbacks.summary_cache, aggregate_cache]:
+        cache.clear()
+
+def reload_dataset(dataset, filename, full=False):
+    """
+    Load new sheets of the file, or the whole file if full is True, and swap them into dataset.
+    Return True if dataset has changed.
+    """
+
+    with reload_lock:
+        current = dict(dataset)
+        new = load_data(filename) if full else append_data(current, filename)
+        if new is current or new["version"] == current["version"]:
+            return False
+        if current.get("backend") == "sqlite":
+            attach_database(new)
+
+        swap_dataset(dataset, new)
+        return True
+
+def newer_store(dataset):
+    """
+    Check whether the latest store in the store directory of dataset has another version, e.g. written by another worker.
+    """
+
+    if dataset.get("store_dir") is None:
+        return False
+
+    return latest_store(dataset["store_dir"]) not in (None, dataset["version"])
+
+def register_admin_endpoint(server, dataset, filename):
+    """
+    Register "/admin/reload" endpoint on Flask server, e.g. curl -X POST -H "X-Admin-Token: ..." host/admin/reload?full=1.
+    Endpoint is disabled unless ADMIN_TOKEN environment variable is set.
+    Only the worker process that receives the request reloads right away. Other workers, e.g. of gunicorn, swap in
+    the new store at the next interval of their watcher, so start_watcher should run in every worker.
+    """
+
+    @server.route("/admin/reload", methods=["POST"])
+    def admin_reload():
+        token = os.environ.get("ADMIN_TOKEN")
+        if not token or not hmac.compare_digest(flask.request.headers.get("X-Admin-Token", "").encode(), token.encode()):
+            flask.abort(403)
+
+        changed = reload_dataset(dataset, filename, full=flask.request.args.get("full") == "1")
+        current = dict(dataset)
+
+        return flask.jsonify({
+            "changed": changed,
+            "version": current["version"],
+            "dates": [d.isoformat() for d in current["dates"]],
+            "visitors": len(current["visits"])
+        })
+
+def start_watcher(dataset, filename, interval=60):
+    """
+    Start daemon thread that reloads dataset when modified time of the file changes
+    or when another worker has written a new store of the file.
+    """
+
+    def watch():
+        mtime = os.stat(filename).st_mtime_ns
+        while True:
+            time.sleep(interval)
+            try:
+                new_mtime = os.stat(filename).st_mtime_ns
+                if new_mtime != mtime or newer_store(dict(dataset)):
+                    reload_dataset(dataset, filename)
+                    mtime = new_mtime
+            except Exception:
+                # Workbook may be in the middle of being saved, try again at the next interval
+                reload_log.exception(f"Reload of {filename} failed")
+
+    thread = threading.Thread(target=watch, name="dataset-watcher", daemon=True)
+    thread.start()
+
+    return thread
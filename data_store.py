@@ -0,0 +1,282 @@
+import hashlib
+import json
+import os
+import shutil
+import numpy as np
+import pandas as pd
+from datetime import date
+
+# Name of file that describes columns of a stored dataset
+meta_filename = "meta.json"
+
+# Version of stored schema, stores written with other versions are rebuilt
+store_version = 2
+
+def source_key(filename):
+    """
+    Generate key of source file from its content hash and modified time.
+    """
+
+    digest = hashlib.sha256(f"v{store_version}".encode())
+    with open(filename, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            digest.update(chunk)
+    digest.update(str(os.stat(filename).st_mtime_ns).encode())
+
+    return digest.hexdigest()[:20]
+
+def default_store_dir(filename):
+    """
+    Generate store directory next to source file.
+    """
+
+    return os.path.splitext(filename)[0] + ".store"
+
+def narrow_integer_dtype(min_value, max_value):
+    """
+    Find the smallest signed integer dtype that holds min and max values.
+    """
+
+    for dtype in [np.int8, np.int16, np.int32]:
+        if np.iinfo(dtype).min <= min_value and max_value <= np.iinfo(dtype).max:
+            return np.dtype(dtype)
+
+    return np.dtype(np.int64)
+
+def category_order(categories):
+    """
+    Find order of categories sorted by value, or by text of values when values of different types can not be compared.
+    """
+
+    try:
+        return pd.Index(categories, dtype=object).argsort()
+    except TypeError:
+        return np.array(sorted(range(len(categories)), key=lambda index: str(categories[index])), dtype=np.int64)
+
+def missing_values(rows, dtype):
+    """
+    Generate rows of missing values of dtype, NaN for floats and NaT for datetimes, -1 codes for categories.
+    """
+
+    return np.full(rows, np.nan if dtype.kind == "f" else -1 if dtype.kind == "i" else dtype.type("NaT"), dtype=dtype)
+
+def write_chunks(chunks, store_dir, key, sheets=None):
+    """
+    Write (date, visits of the date) chunks to store directory as one raw binary file per column.
+    Names of source sheets are kept in meta file, so a reload reads only sheets that are not in the store.
+    Chunks are written one at a time into parts and then appended to column files in date order,
+    so peak memory is bounded by the largest chunk. A later chunk of the same date replaces the earlier one.
+    A column is categorical if it is categorical or object in some chunk, e.g. a text column that is empty in the first
+    sheet, and is written as codes of categories shared by all chunks, categories are kept in meta file.
+    Signed integer columns are narrowed to the smallest dtype that holds values of every chunk.
+    """
+
+    # Write into temporary directory first, so readers never see a partial store
+    tmp_dir = os.path.join(store_dir, f".{key}-{os.getpid()}")
+    parts_dir = os.path.join(tmp_dir, "parts")
+    try:
+        os.makedirs(parts_dir, exist_ok=True)
+
+        parts = dict()
+        columns = dict()
+        for number, (chunk_date, visits) in enumerate(chunks):
+            part = {"path": os.path.join(parts_dir, str(number)), "rows": len(visits), "dtypes": dict(), "coded": set()}
+            os.makedirs(part["path"])
+
+            for col in visits.columns:
+                column = columns.setdefault(col, {"categories": dict(), "categorical": False, "dtypes": [], "min": None, "max": None})
+                if visits[col].isna().all():
+                    # Dtype of a chunk without values depends on the reader, so its values are written with the column dtype
+                    continue
+
+                if isinstance(visits[col].dtype, pd.CategoricalDtype) or visits[col].dtype == object:
+                    # Map codes of the chunk to codes of categories shared by all chunks, missing values stay -1
+                    column["categorical"] = True
+                    codes, uniques = pd.factorize(visits[col])
+                    lookup = np.array([column["categories"].setdefault(value, len(column["categories"])) for value in uniques] + [-1],
+                                      dtype=np.int32)
+                    values = lookup[codes]
+                    part["coded"].add(col)
+                else:
+                    values = visits[col].to_numpy()
+                    column["dtypes"].append(values.dtype)
+                    if values.dtype.kind == "i" and len(values) > 0:
+                        column["min"] = min(values.min(), column["min"]) if column["min"] is not None else values.min()
+                        column["max"] = max(values.max(), column["max"]) if column["max"] is not None else values.max()
+
+                part["dtypes"][col] = values.dtype
+                values.tofile(os.path.join(part["path"], f"{col}.bin"))
+
+            if chunk_date in parts:
+                shutil.rmtree(parts[chunk_date]["path"])
+            parts[chunk_date] = part
+
+        dates = sorted(parts.keys())
+        meta = {
+            "key": key,
+            "rows": sum(parts[d]["rows"] for d in dates),
+            "dates": [d.isoformat() for d in dates],
+            "offsets": [0] + np.cumsum([parts[d]["rows"] for d in dates]).tolist(),
+            "sheets": sheets,
+            "columns": []
+        }
+
+        for col, column in columns.items():
+            if column["categorical"]:
+                # Values of chunks where the column is not categorical, e.g. numbers in a text column, become categories too
+                for d in dates:
+                    part = parts[d]
+                    if col in part["dtypes"] and col not in part["coded"]:
+                        path = os.path.join(part["path"], f"{col}.bin")
+                        codes, uniques = pd.factorize(np.fromfile(path, dtype=part["dtypes"][col]))
+                        lookup = np.array([column["categories"].setdefault(value, len(column["categories"])) for value in uniques] + [-1],
+                                          dtype=np.int32)
+                        lookup[codes].tofile(path)
+                        part["dtypes"][col] = lookup.dtype
+
+                # Sort categories, so codes follow the order of values like in pandas categoricals
+                categories = list(column["categories"].keys())
+                order = category_order(categories)
+                remap = np.full(len(categories) + 1, -1, dtype=np.int64)
+                remap[order] = np.arange(len(categories))
+                dtype = narrow_integer_dtype(-1, len(categories))
+                missing = np.dtype(np.int32)
+                transform = lambda values: remap[values].astype(dtype)
+                meta["columns"].append({"name": col, "dtype": dtype.str, "categories": [categories[index] for index in order]})
+            else:
+                dtype = np.result_type(*column["dtypes"]) if column["dtypes"] else np.dtype(np.float64)
+                if dtype.kind in "iub" and any(col not in parts[d]["dtypes"] and parts[d]["rows"] > 0 for d in dates):
+                    # Missing values of integer and boolean columns are NaN like in pandas
+                    dtype = np.dtype(np.float64)
+                elif dtype.kind == "i" and column["min"] is not None:
+                    dtype = narrow_integer_dtype(column["min"], column["max"])
+                missing = dtype
+                transform = lambda values: values.astype(dtype)
+                meta["columns"].append({"name": col, "dtype": dtype.str})
+
+            with open(os.path.join(tmp_dir, f"{col}.bin"), "wb") as file:
+                for d in dates:
+                    if col in parts[d]["dtypes"]:
+                        values = np.fromfile(os.path.join(parts[d]["path"], f"{col}.bin"), dtype=parts[d]["dtypes"][col])
+                    else:
+                        values = missing_values(parts[d]["rows"], missing)
+                    transform(values).tofile(file)
+
+        shutil.rmtree(parts_dir)
+        with open(os.path.join(tmp_dir, meta_filename), "w") as file:
+            json.dump(meta, file)
+
+        try:
+            os.replace(tmp_dir, os.path.join(store_dir, key))
+        except OSError:
+            # Another process has already written the store for this key
+            pass
+    finally:
+        # Temporary directory is left only if writing has failed or another process has written the store
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    remove_unused_stores(store_dir, key)
+
+def in_use_filename(pid):
+    """
+    Generate name of file in a store that marks that process pid serves the store.
+    """
+
+    return f".in-use-{pid}"
+
+def mark_store_in_use(store_dir, key):
+    """
+    Mark store of key as served by this process, so it is not removed until this process swaps it out.
+    """
+
+    open(os.path.join(store_dir, key, in_use_filename(os.getpid())), "a").close()
+
+def release_store(store_dir, key):
+    """
+    Remove mark of this process from store of key, e.g. after a reload has swapped in a newer store.
+    """
+
+    try:
+        os.remove(os.path.join(store_dir, key, in_use_filename(os.getpid())))
+    except FileNotFoundError:
+        pass
+
+def store_in_use(path):
+    """
+    Check whether a running process has marked store at path as in use.
+    """
+
+    try:
+        names = os.listdir(path)
+    except FileNotFoundError:
+        return False
+
+    for name in names:
+        if name.startswith(in_use_filename("")):
+            try:
+                os.kill(int(name[len(in_use_filename("")):]), 0)
+                return True
+            except PermissionError:
+                # Process of another user is running
+                return True
+            except (ProcessLookupError, ValueError):
+                pass
+
+    return False
+
+def latest_store(store_dir):
+    """
+    Find key of the most recently written store in store directory, None if there is no store.
+    """
+
+    keys = [name for name in os.listdir(store_dir) if not name.startswith(".")] if os.path.isdir(store_dir) else []
+
+    return max(keys, key=lambda name: os.path.getmtime(os.path.join(store_dir, name, meta_filename)), default=None)
+
+def remove_unused_stores(store_dir, key):
+    """
+    Remove stores of older source files that no running process serves.
+    Store of each older file is removed by the last worker that swaps it out, so workers that have not reloaded yet
+    keep filtering and querying their store.
+    """
+
+    for name in os.listdir(store_dir):
+        path = os.path.join(store_dir, name)
+        if name != key and not name.startswith(".") and not store_in_use(path):
+            shutil.rmtree(path, ignore_errors=True)
+
+def read_store(store_dir, key):
+    """
+    Map dataset from store directory read-only, return None if there is no store for the key.
+    Rows of dataset["dates"][i] are dataset["visits"].iloc[dataset["offsets"][i]:dataset["offsets"][i + 1]].
+    Processes that map the same store share its pages through the OS page cache.
+    """
+
+    path = os.path.join(store_dir, key)
+    if not os.path.exists(os.path.join(path, meta_filename)):
+        return None
+
+    with open(os.path.join(path, meta_filename)) as file:
+        meta = json.load(file)
+
+    visits = dict()
+    for column in meta["columns"]:
+        dtype = np.dtype(column["dtype"])
+        if meta["rows"] > 0:
+            values = np.memmap(os.path.join(path, f"{column['name']}.bin"), dtype=dtype, mode="r", shape=(meta["rows"],))
+        else:
+            # Empty file can not be memory-mapped
+            values = np.empty(0, dtype=dtype)
+        if "categories" in column:
+            values = pd.Categorical.from_codes(values, column["categories"])
+        visits[column["name"]] = values
+
+    return {
+        # Not copying keeps every column backed by its mapped file
+        "visits": pd.DataFrame(visits, copy=False),
+        "dates": [date.fromisoformat(d) for d in meta["dates"]],
+        "offsets": np.array(meta["offsets"]),
+        "sheets": meta.get("sheets"),
+        "store_dir": store_dir,
+        "version": key
+    }
@@ -0,0 +1,140 @@
+import concurrent.futures
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from coalesce import checkpoint
+
+def filter_key(state, version):
+    """
+    Generate canonical hash of filter state for a dataset version.
+    """
+
+    canonical = json.dumps([version, state], sort_keys=True, separators=(",", ":"), default=str)
+
+    return hashlib.sha1(canonical.encode()).hexdigest()
+
+class FilterCache:
+    """
+    Least recently used cache of filter results with time to live and memory limit.
+    Values are NumPy arrays, e.g. row positions of filtered visitors, and their size is counted by nbytes
+    unless the size is given.
+    """
+
+    def __init__(self, max_bytes=64 * 2 ** 20, ttl=15 * 60):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        # Futures of values that are being computed, keyed like entries
+        self.pending = dict()
+
+    def get(self, key):
+        """
+        Return cached value of key or None if it is missing or expired.
+        """
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def __contains__(self, key):
+        """
+        Check whether key is cached and not expired, without counting a hit or miss.
+        """
+
+        with self.lock:
+            entry = self.entries.get(key)
+            return entry is not None and entry[0] >= time.monotonic()
+
+    def get_or_compute(self, key, compute, size=None):
+        """
+        Return cached value of key or compute it with compute() and cache it, size(value) counts its bytes if given.
+        Concurrent calls of the same key share one computation, the other calls wait for its value and stop at
+        coalesce.checkpoint if their own request is superseded meanwhile. If the computing call fails, e.g. because
+        its request is superseded, a waiting call computes the value itself.
+        """
+
+        while True:
+            value = self.get(key)
+            if value is not None:
+                return value
+
+            with self.lock:
+                future = self.pending.get(key)
+                if future is None:
+                    future = self.pending[key] = concurrent.futures.Future()
+                    break
+
+            while True:
+                try:
+                    return future.result(timeout=0.05)
+                except concurrent.futures.TimeoutError:
+                    checkpoint()
+                except Exception:
+                    # Computing call has failed, compute again
+                    break
+
+        try:
+            value = compute()
+            self.put(key, value, nbytes=size(value) if size is not None else None)
+            future.set_result(value)
+            return value
+        except BaseException as error:
+            future.set_exception(error)
+            raise
+        finally:
+            with self.lock:
+                del self.pending[key]
+
+    def put(self, key, value, nbytes=None):
+        """
+        Cache value of key and evict least recently used values until the cache fits its memory limit.
+        """
+
+        if nbytes is None:
+            nbytes = value.nbytes
+        if nbytes > self.max_bytes:
+            return
+
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+
+            self.entries[key] = (time.monotonic() + self.ttl, value, nbytes)
+            self.size += nbytes
+
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+
+    def clear(self):
+        """
+        Remove all cached values, e.g. when dataset is reloaded.
+        """
+
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def stats(self):
+        """
+        Return number of entries, cached bytes, hits and misses.
+        """
+
+        with self.lock:
+            return {"entries": len(self.entries), "bytes": self.size, "hits": self.hits, "misses": self.misses}
+
+    def _remove(self, key):
+        self.size -= self.entries.pop(key)[2]
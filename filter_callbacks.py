@@ -1,27 +1,92 @@
-from dash.dependencies import Input, Output, State, MATCH, ALL
+from dash.dependencies import Input, Output, State, MATCH, ALL, ClientsideFunction
 import dash
+import math
+import os
+from concurrent.futures import CancelledError
+from dash.exceptions import PreventUpdate
+from datetime import timedelta
 import pandas as pd
 import numpy as np
-from datetime import date
+from data_preprocessing import data_columns
 from filter_components import generate_time_between_checkpoints_division
+from filter_engine import predicates, date_range_offsets, take_rows, cube_count, range_predicates, indexed_range_mask, presence_count
+from filter_cache import FilterCache, filter_key
+from table_output import table_records
+import filter_pool
+import sql_backend
+from coalesce import latest_request, checkpoint
+from aggregates import cached_flow_aggregates, transition_figure, duration_figure, clinic_hour_figure
+import metrics
+from metrics import trace, stage
 
-def filter_data_by_date(days, start_date, end_date):
+# Cache of filtered and sorted row positions shared by all callbacks, e.g. POSITIONS_CACHE_MB=128
+cache = FilterCache(max_bytes=int(float(os.environ.get("POSITIONS_CACHE_MB", 64)) * 2 ** 20), ttl=15 * 60)
+
+# Cache of masks of each filter component, e.g. MASK_CACHE_MB=512
+mask_cache = FilterCache(max_bytes=int(float(os.environ.get("MASK_CACHE_MB", 256)) * 2 ** 20), ttl=15 * 60)
+
+# Cache of date range summaries, e.g. SUMMARY_CACHE_MB=2
+summary_cache = FilterCache(max_bytes=int(float(os.environ.get("SUMMARY_CACHE_MB", 1)) * 2 ** 20), ttl=15 * 60)
+
+# Inputs of filter fields in the order of filter_state arguments, datetime columns ids are passed as State
+filter_inputs = [
+    Input("date-picker-range", "start_date"),
+    Input("date-picker-range", "end_date"),
+    Input("gender-checklist", "value"),
+    Input("final-status-checklist", "value"),
+    Input("appointment-checklist", "value"),
+    Input("min-age-input", "value"),
+    Input("max-age-input", "value"),
+    Input("min-start-time-input", "value"),
+    Input("max-start-time-input", "value"),
+    Input("min-total-time-input", "value"),
+    Input("max-total-time-input", "value"),
+    Input("clinics-checklist", "value"),
+    Input("checkpoints-ordering-dropdown", "value"),
+    Input("checkpoints-ordering-radioItems", "value"),
+    Input({"type": "start-checkpoint-dropdown", "index": ALL}, "value"),
+    Input({"type": "end-checkpoint-dropdown", "index": ALL}, "value"),
+    Input({"type": "min-btw-time-input", "index": ALL}, "value"),
+    Input({"type": "max-btw-time-input", "index": ALL}, "value"),
+    Input({"type": "datetime-column-radioItems", "index": ALL}, "value")
+]
+
+def filter_data_by_date(dataset, start_date, end_date):
+    """
+    Slice visits with date between start date and end date.
+    """
+    
+    start, stop = date_range_offsets(dataset, start_date, end_date)
+    
+    return dataset["visits"].iloc[start:stop]
+
+def date_range_summary(dataset, start_date, end_date):
     """
-    Concatenate data from sheets with date between start date and end date.
+    Summarize visitors with date between start date and end date into min and max age, available clinics,
+    number of visitors and row offsets of the date range. Summaries are memoized by dataset version and date range.
     """
     
-    if start_date > end_date:
-        tmp_end = start_date
-        start_date = end_date
-        end_date = tmp_end
+    start, stop = date_range_offsets(dataset, start_date, end_date)
+    key = filter_key(["summary", start, stop], dataset.get("version"))
+    
+    summary = summary_cache.get(key)
+    if summary is None:
+        filtered = dataset["visits"].iloc[start:stop]
         
-    dt_list = []
-    for dt in pd.date_range(start_date, end_date):
-        dt_list.append(date(dt.year, dt.month, dt.day))
+        # Count visitors of each clinic code, missing clinics have code -1
+        clinic_counts = np.bincount(filtered["clinic"].cat.codes.to_numpy() + 1,
+                                    minlength=len(dataset["clinics"]) + 1)[1:]
         
-    filtered = pd.concat([days.get(d) for d in dt_list], ignore_index=True)
+        summary = {
+            "min_age": filtered["age"].min() if stop > start else None,
+            "max_age": filtered["age"].max() if stop > start else None,
+            "clinics": [clinic for clinic, count in zip(dataset["clinics"], clinic_counts) if count > 0],
+            "rows": stop - start,
+            "offsets": (start, stop)
+        }
+        summary_cache.put(key, summary, nbytes=64 * len(summary["clinics"]) + 256)
     
-    return filtered
+    return summary
 
 def datetime_columns_dict(datetime_columns_id, datetime_columns):
     """
@@ -34,249 +99,429 @@ def datetime_columns_dict(datetime_columns_id, datetime_columns):
 
     return datetime_dict
 
-def callback_data_table(app, days):
+def filter_state(start_date, end_date, gender, final_status, appointment,
+                 min_age, max_age, min_start_time, max_start_time,
+                 min_total_time, max_total_time, clinics, checkpoints,
+                 isOrdered, start_checkpoints, end_checkpoints,
+                 min_btw, max_btw, datetime_columns, datetime_columns_id):
+    """
+    Normalize filter fields into filter state, so the same filter always has the same state.
+    """
+    
+    start_date = pd.Timestamp(start_date).date()
+    end_date = pd.Timestamp(end_date).date()
+    
+    return {
+        "start_date": min(start_date, end_date).isoformat(),
+        "end_date": max(start_date, end_date).isoformat(),
+        "gender": sorted(gender),
+        "final_status": sorted(final_status),
+        "appointment": sorted(appointment),
+        "age": [min_age, max_age],
+        "start_time": [min_start_time, max_start_time],
+        "total_time": [min_total_time, max_total_time],
+        "clinics": sorted(clinics),
+        "checkpoints": checkpoints,
+        "isOrdered": isOrdered,
+        "btw": [[start, end, min_btw[index], max_btw[index]]
+                for index, (start, end) in enumerate(zip(start_checkpoints, end_checkpoints))
+                if start is not None and end is not None],
+        "datetime_columns": datetime_columns_dict(datetime_columns_id, datetime_columns)
+    }
+
+def filter_mask(dataset, state):
+    """
+    Slice visits between start date and end date of filter state and generate mask of filtered visitors.
+    Mask of each filter component is cached, so only masks of changed filter fields are generated.
+    Range filters use sorted indexes of the dataset.
+    """
+    
+    start, stop = date_range_offsets(dataset, state["start_date"], state["end_date"])
+    filtered = dataset["visits"].iloc[start:stop]
+    
+    mask = np.ones(len(filtered), dtype=bool)
+    for name, params, predicate in predicates(state):
+        key = filter_key([state["start_date"], state["end_date"], name, params], dataset.get("version"))
+        predicate_mask = mask_cache.get(key)
+        if predicate_mask is None:
+            checkpoint()
+            with stage(f"predicate_{name}") as info:
+                if name in range_predicates and "range_indexes" in dataset:
+                    predicate_mask = indexed_range_mask(dataset, start, stop, params)
+                else:
+                    predicate_mask = predicate(filtered, params)
+                info["rows"] = int(np.count_nonzero(predicate_mask))
+            mask_cache.put(key, predicate_mask)
+        mask &= predicate_mask
+    
+    return filtered, mask
+
+def filter_visitors(dataset, state):
+    """
+    Filter visitors by filter state.
+    """
+    
+    filtered, mask = filter_mask(dataset, state)
+    
+    return filtered[mask]
+
+def filter_positions(dataset, state, session=None):
+    """
+    Return row positions of filtered visitors in dataset["visits"], cached by filter state.
+    Visitors of each date are filtered in pool of workers if it is started. A newer request of the same session
+    cancels this one with concurrent.futures.CancelledError.
+    Callbacks of the label, the table and the graphs that filter the same state at once share one computation.
+    """
+    
+    def compute():
+        if filter_pool.pool_available(dataset):
+            return filter_pool.pool_filter_positions(dataset, state, session)
+        
+        # Positions come from the mask, so rows of filtered visitors are never copied
+        start, stop = date_range_offsets(dataset, state["start_date"], state["end_date"])
+        return start + np.flatnonzero(filter_mask(dataset, state)[1])
+    
+    return cache.get_or_compute(filter_key(state, dataset.get("version")), compute)
+
+def sort_positions(dataset, state, positions, sort_by):
+    """
+    Sort row positions of filtered visitors by columns of "data-table" sort_by property, cached by filter state.
+    """
+    
+    if not sort_by:
+        return positions
+    
+    key = filter_key([state, sort_by], dataset.get("version"))
+    sorted_positions = cache.get(key)
+    if sorted_positions is None:
+        checkpoint()
+        columns = [col["column_id"] for col in sort_by]
+        sorted_positions = take_rows(dataset["visits"], positions, columns).sort_values(
+            by=columns,
+            ascending=[col["direction"] == "asc" for col in sort_by],
+            kind="mergesort"
+        ).index.to_numpy()
+        cache.put(key, sorted_positions)
+    
+    return sorted_positions
+
+def count_visitors(dataset, state, session=None):
+    """
+    Count filtered visitors in memory, from cube of visitors when the cube covers all filter fields.
+    """
+    
+    with stage("cube_count"):
+        total = cube_count(dataset, state)
+    if total is None:
+        with stage("filter") as info:
+            total = len(filter_positions(dataset, state, session))
+            info["rows"] = total
+    
+    return total
+
+def query_page(dataset, state, sort_by, page_current, page_size, session=None):
+    """
+    Filter, sort and page visitors in memory. Filtered and sorted row positions are cached,
+    so changing page or sorting does not filter again.
+    Return frame of current page with columns of data_columns and number of filtered visitors.
+    """
+    
+    with stage("filter") as info:
+        positions = filter_positions(dataset, state, session)
+        info["rows"] = len(positions)
+    
+    page_count = max(math.ceil(len(positions) / page_size), 1)
+    page_current = min(page_current or 0, page_count - 1)
+    with stage("sort") as info:
+        sorted_positions = sort_positions(dataset, state, positions, sort_by)
+        info["rows"] = len(sorted_positions)
+    
+    with stage("page") as info:
+        page_positions = sorted_positions[page_current * page_size:(page_current + 1) * page_size]
+        page = take_rows(dataset["visits"], page_positions, data_columns)
+        info["rows"] = len(page)
+    
+    return page, len(positions)
+
+def query_backend(dataset):
     """
-    Update data in "data-table" table and number of visitors in "total-visitors-label" label.
+    Return (count_visitors, query_page, query_positions) functions of query backend of dataset,
+    in memory unless a database is attached.
+    """
+    
+    if dataset.get("backend") == "sqlite":
+        return sql_backend.count_visitors, sql_backend.query_page, sql_backend.query_positions
+    
+    return count_visitors, query_page, filter_positions
+
+def table_filters_changed():
+    """
+    Check whether a filter field rather than page, page size or sorting of "data-table" triggered the callback.
+    Calls outside of a Dash request, e.g. in benchmarks, count as filter changes.
+    """
+    
+    try:
+        triggered = dash.callback_context.triggered_prop_ids
+    except (dash.exceptions.MissingCallbackContextException, LookupError):
+        return True
+    
+    return any(not prop.startswith("data-table.") for prop in triggered)
+
+def debounce_request(dataset, state, filters_changed=True):
+    """
+    Check whether request should wait for a newer request of its session before it computes.
+    Requests whose filtered visitors are cached or that only change page or sorting compute right away.
+    """
+    
+    return filters_changed and filter_key(state, dataset.get("version")) not in cache
+
+def callback_total_visitors_label(app, dataset):
+    """
+    Update number of visitors in "total-visitors-label" label.
+    The number is counted from cube of visitors when the cube covers all filter fields.
     """
     
     @app.callback(
         Output("total-visitors-label", "children"),
+        *filter_inputs,
+        State({"type": "datetime-column-radioItems", "index": ALL}, "id"),
+        State("session-id", "data")
+    )
+    def update_total_visitors_label(*filters):
+        *filters, session = filters
+        state = filter_state(*filters)
+        current = dict(dataset)
+        
+        try:
+            with latest_request(session, "update_total_visitors_label", debounce_request(current, state)), \
+                 trace("update_total_visitors_label", inputs=state, session=session):
+                total = query_backend(current)[0](current, state, session)
+        except CancelledError:
+            # A newer request of this page has replaced this one
+            raise PreventUpdate
+        
+        return f"Total filtered visitors: {total}"
+
+def callback_data_table(app, dataset):
+    """
+    Update current page of "data-table" table.
+    Filtered visitors are cached on server, so changing page or sorting does not filter again.
+    Current page is moved to the last page when filters leave fewer pages.
+    """
+    
+    @app.callback(
         Output("data-table", "data"),
-        Input("date-picker-range", "start_date"),
-        Input("date-picker-range", "end_date"),
-        Input("gender-checklist", "value"),
-        Input("final-status-checklist", "value"),
-        Input("appointment-checklist", "value"),
-        Input("min-age-input", "value"),
-        Input("max-age-input", "value"),
-        Input("min-start-time-input", "value"),
-        Input("max-start-time-input", "value"),
-        Input("min-total-time-input", "value"),
-        Input("max-total-time-input", "value"),
-        Input("clinics-checklist", "value"),
-        Input("checkpoints-ordering-dropdown", "value"),
-        Input("checkpoints-ordering-radioItems", "value"),
-        Input({"type": "start-checkpoint-dropdown", "index": ALL}, "value"),
-        Input({"type": "end-checkpoint-dropdown", "index": ALL}, "value"),
-        Input({"type": "min-btw-time-input", "index": ALL}, "value"),
-        Input({"type": "max-btw-time-input", "index": ALL}, "value"),
-        Input({"type": "datetime-column-radioItems", "index": ALL}, "value"),
-        State({"type": "datetime-column-radioItems", "index": ALL}, "id")
+        Output("data-table", "page_count"),
+        Output("data-table", "page_current"),
+        *filter_inputs,
+        Input("data-table", "page_current"),
+        Input("data-table", "page_size"),
+        Input("data-table", "sort_by"),
+        State({"type": "datetime-column-radioItems", "index": ALL}, "id"),
+        State("session-id", "data")
     )
     def update_data_table(start_date, end_date, gender, final_status, appointment,
                           min_age, max_age, min_start_time, max_start_time,
                           min_total_time, max_total_time, clinics, checkpoints,
                           isOrdered,start_checkpoints, end_checkpoints,
-                          min_btw, max_btw, datetime_columns, datetime_columns_id):
-        # Filter data between given start date and end date
-        filtered = filter_data_by_date(days, start_date, end_date)
-        
-        # Filter appointment
-        if len(appointment) == 1:
-            if 1 in appointment:
-                filtered = filtered[(filtered["visit_dt"].dt.minute.isin([0, 30])) & (filtered["visit_dt"].dt.second == 0)]
-            elif 0 in appointment:
-                filtered = filtered[(~filtered["visit_dt"].dt.minute.isin([0, 30])) | (filtered["visit_dt"].dt.second != 0)]
-        elif len(appointment) == 0:
-            filtered = filtered[filtered["vn"] == -1]
-        # Filter datetime columns
-        for col, value in datetime_columns_dict(datetime_columns_id, datetime_columns).items():
-            if value == 1:
-                filtered = filtered[~filtered[col].isna()]
-            elif value == 0:
-                filtered = filtered[filtered[col].isna()]
+                          min_btw, max_btw, datetime_columns, page_current, page_size,
+                          sort_by, datetime_columns_id, session):
+        state = filter_state(start_date, end_date, gender, final_status, appointment,
+                             min_age, max_age, min_start_time, max_start_time,
+                             min_total_time, max_total_time, clinics, checkpoints,
+                             isOrdered, start_checkpoints, end_checkpoints,
+                             min_btw, max_btw, datetime_columns, datetime_columns_id)
+        current = dict(dataset)
         
-        # Filter gender, final status, age, and clinics
-        filtered = filtered[(filtered["gender"].isin(gender)) &
-                            (filtered["final_status"].isin(final_status)) &
-                            (filtered["age"] >= min_age) & (filtered["age"] <= max_age) &
-                            (filtered["clinic"].isin(clinics))]
-        
-        # Filter visitors with start time between min_start_time and max_start_time
-        filtered["start_time"] = filtered[[col for col in filtered.columns if col.endswith("_dt") and col != "visit_dt"]].min(axis=1)
-        filtered = filtered[(filtered["start_time"].dt.hour >= min_start_time) & (filtered["start_time"].dt.hour < max_start_time)]
-        
-        # Filter visitors with total time in process between min_total_time and max_total_time
-        filtered["end_time"] = filtered[[col for col in filtered.columns if col.endswith("_dt") and col != "visit_dt"]].max(axis=1)
-        filtered["total_time"] = (filtered["end_time"] - filtered["start_time"]) / np.timedelta64(1, 'h')
-        filtered = filtered[(filtered["total_time"] >= min_total_time) & (filtered["total_time"] < max_total_time )]
-        
-        # Drop unused columns
-        filtered.drop(["start_time", "end_time", "total_time"], axis=1)
-        
-        # Filter visitors with time between two checkpoints is between min_btw and max_btw
-        def generate_time_btw(columns):
-            if pd.isnull(columns[0]) or pd.isnull(columns[1]):
-                return np.nan
-            
-            return abs((columns[0] - columns[1]) / np.timedelta64(1, 'h'))
-        
-        for index in range(max(len(start_checkpoints), len(end_checkpoints))):
-            if start_checkpoints[index] == None or end_checkpoints[index] == None:
-                continue
-            
-            filtered["time_btw"] = filtered[[start_checkpoints[index], end_checkpoints[index]]].apply(lambda columns: generate_time_btw(columns),
-                                                                                                      axis=1)
-            if len(filtered) > 0:
-                filtered = filtered[(filtered["time_btw"] >= min_btw[index]) &
-                                    (filtered["time_btw"] < max_btw[index]) |
-                                    (filtered["time_btw"].isna())]
+        try:
+            with latest_request(session, "update_data_table", debounce_request(current, state, table_filters_changed())), \
+                 trace("update_data_table", inputs=[state, page_current, page_size, sort_by], session=session):
+                page, total = query_backend(current)[1](current, state, sort_by, page_current, page_size, session)
                 
-            filtered.drop(["time_btw"], axis=1)
+                with stage("format") as info:
+                    records = table_records(page)
+                    info["rows"] = len(records)
+        except CancelledError:
+            # A newer request of this page has replaced this one
+            raise PreventUpdate
         
-        # Filter visitors that have same checkpoint order with desired checkpoint ordering
-        def order_checkpoints(columns, checkpoints):
-            sequence = []
-            for index in range(len(columns)):
-                if not pd.isnull(columns[index]):
-                    sequence.append((checkpoints[index], columns[index]))
-            
-            sequence = sorted(sequence, key=(lambda x: x[1]))
-            sequence = list(map(lambda x: x[0], sequence))
-            
-            sequence_index = []
-            for checkpoint in checkpoints:
-                if checkpoint in sequence:
-                    sequence_index.append(sequence.index(checkpoint))
-            
-            if sorted(sequence_index) == sequence_index:
-                return True
-            else:
-                return False
-            
-        if checkpoints is not None:
-            filtered["sequence"] = filtered[checkpoints].apply(lambda columns: order_checkpoints(columns, checkpoints), axis=1)
-            if isOrdered == 1:
-                filtered = filtered[filtered["sequence"]]
-            else:
-                filtered = filtered[~filtered["sequence"]]
-            
-            # Drop unused columns
-            filtered.drop(["sequence"], axis=1)
+        page_count = max(math.ceil(total / page_size), 1)
         
-        # Change format in datetime columns
-        for col in [col for col in filtered.columns if col.endswith("_dt")]:
-            filtered[col] = filtered[col].dt.strftime("%d-%m-%Y%n%H:%M:%S")
-        
-        return f"Total filtered visitors: {len(filtered)}", filtered.to_dict("records")
+        # Same page as query_page of both backends shows
+        return records, page_count, min(page_current or 0, page_count - 1)
 
-def callback_age_inputs(app, days):
+def callback_flow_graphs(app, dataset):
     """
-    Update max, min and initial values of age inputs.
+    Update transition matrix, duration histograms and clinic and hour graphs of filtered visitors.
+    Aggregates are cached by filter state, so changing page or sorting of the table does not aggregate again.
     """
     
     @app.callback(
-        Output("min-age-input", "min"),
-        Output("min-age-input", "value"),
-        Output("max-age-input", "max"),
-        Output("max-age-input", "value"),
-        Input("date-picker-range", "start_date"),
-        Input("date-picker-range", "end_date")
+        Output("transitions-graph", "figure"),
+        Output("durations-graph", "figure"),
+        Output("clinic-hour-graph", "figure"),
+        *filter_inputs,
+        State({"type": "datetime-column-radioItems", "index": ALL}, "id"),
+        State("session-id", "data")
     )
-    def update_age_inputs(start_date, end_date):
-        filtered = filter_data_by_date(days, start_date, end_date)
+    def update_flow_graphs(*filters):
+        *filters, session = filters
+        state = filter_state(*filters)
+        current = dict(dataset)
         
-        min_age = min(filtered["age"])
-        max_age = max(filtered["age"])
+        try:
+            with latest_request(session, "update_flow_graphs", debounce_request(current, state)), \
+                 trace("update_flow_graphs", inputs=state, session=session):
+                with stage("filter") as info:
+                    positions = query_backend(current)[2](current, state, session)
+                    info["rows"] = len(positions)
+                
+                checkpoint()
+                with stage("aggregate") as info:
+                    aggregates = cached_flow_aggregates(current, state, positions)
+                    info["rows"] = int(aggregates["transitions"].sum())
+        except CancelledError:
+            # A newer request of this page has replaced this one
+            raise PreventUpdate
         
-        return min_age, min_age, max_age, max_age
-    
-def callback_clinics_checklist(app, days):
+        return transition_figure(aggregates), duration_figure(aggregates), clinic_hour_figure(aggregates)
+
+def callback_date_range_inputs(app, dataset):
     """
-    Update clinics checklist options and initial values.
+    Update max, min and initial values of age inputs and clinics checklist options and initial values
+    from one summary of the date range.
     """
     
     @app.callback(
+        Output("min-age-input", "min"),
+        Output("min-age-input", "value"),
+        Output("max-age-input", "max"),
+        Output("max-age-input", "value"),
         Output("clinics-checklist", "options"),
         Output("clinics-checklist", "value"),
         Input("date-picker-range", "start_date"),
         Input("date-picker-range", "end_date")
     )
-    def update_clinics_checklist(start_date, end_date):
-        filtered = filter_data_by_date(days, start_date, end_date)
+    def update_date_range_inputs(start_date, end_date):
+        current = dict(dataset)
+        summary = date_range_summary(current, start_date, end_date)
+        
+        # Keep age inputs if there is no visitor in the date range
+        if summary["rows"] == 0:
+            min_age = max_age = dash.no_update
+        else:
+            min_age = summary["min_age"]
+            max_age = summary["max_age"]
         
-        all_clinics = set()
-        for day in days.values():
-            all_clinics = all_clinics.union(day["clinic"].unique())
-            
-        available_clinics = filtered["clinic"].unique()
-        disabled_clinics = all_clinics.difference(available_clinics)
+        available_clinics = summary["clinics"]
+        disabled_clinics = set(current["clinics"]).difference(available_clinics)
         
         options = [{"label": clinic, "value": clinic, "disabled": True} if clinic in disabled_clinics
-                   else {"label": clinic, "value": clinic, "disabled": False} for clinic in all_clinics]
+                   else {"label": clinic, "value": clinic, "disabled": False} for clinic in current["clinics"]]
         options = sorted(options, key=(lambda key: key["label"]))
         options = sorted(options, key=(lambda key: key["disabled"]))
         
-        return options, available_clinics
+        return min_age, min_age, max_age, max_age, options, available_clinics
+
+def callback_date_picker_range_bounds(app, dataset):
+    """
+    Update bounds of date picker range when dataset is reloaded while the page is open.
+    """
     
-def callback_checkpoints_ordering_dropdown(app, days):
+    @app.callback(
+        Output("date-picker-range", "min_date_allowed"),
+        Output("date-picker-range", "max_date_allowed"),
+        Output("dataset-version", "data"),
+        Input("dataset-version-interval", "n_intervals"),
+        State("dataset-version", "data")
+    )
+    def update_date_picker_range_bounds(n_intervals, version):
+        current = dict(dataset)
+        if current.get("version") == version:
+            return dash.no_update, dash.no_update, dash.no_update
+        
+        dates = current["dates"]
+        
+        return min(dates), max(dates) + timedelta(days=1), current.get("version")
+    
+def callback_checkpoints_preview_label(app, dataset):
     """
-    Update items in checkpoints ordering dropdown.
+    Update number of visitors in the date range with selected checkpoints from counts of checkpoints patterns,
+    before visitors are filtered.
     """
     
     @app.callback(
-        Output("checkpoints-ordering-dropdown", "options"),
+        Output("checkpoints-preview-label", "children"),
+        Input("date-picker-range", "start_date"),
+        Input("date-picker-range", "end_date"),
         Input({"type": "datetime-column-radioItems", "index": ALL}, "value"),
         State({"type": "datetime-column-radioItems", "index": ALL}, "id")
     )
-    def update_checkpoints_ordering_dropdown(datetime_columns, datetime_columns_id):
-        checkpoints = []
+    def update_checkpoints_preview_label(start_date, end_date, datetime_columns, datetime_columns_id):
+        state = {
+            "start_date": start_date,
+            "end_date": end_date,
+            "datetime_columns": datetime_columns_dict(datetime_columns_id, datetime_columns)
+        }
         
-        for col, value in datetime_columns_dict(datetime_columns_id, datetime_columns).items():
-            if value == 1:
-                checkpoints.append({"label": col, "value": col})
-                
-        return checkpoints
+        return f"Visitors with selected checkpoints: {presence_count(dict(dataset), state)}"
     
-def callback_checkpoints_ordering_radioItems(app, days):
+def callback_debug_overlay(app, dataset):
     """
-    Update checkpoints ordering radioItems if there is no any checkpoint in dropdown, disable radioItems.
+    Show timing of each stage of the latest "data-table" update of this page.
+    Callback is registered only if debug overlay is enabled, like its division in the layout.
     """
     
+    if not metrics.debug_overlay:
+        return
+    
     @app.callback(
+        Output("debug-overlay", "children"),
+        Input("data-table", "data"),
+        State("session-id", "data")
+    )
+    def update_debug_overlay(data, session):
+        current = metrics.last_trace(session, "update_data_table")
+        
+        return metrics.format_trace(current) if current is not None else ""
+    
+def callback_checkpoints_ordering_dropdown(app, dataset):
+    """
+    Update items in checkpoints ordering dropdown on client.
+    """
+    
+    app.clientside_callback(
+        ClientsideFunction(namespace="filter", function_name="update_checkpoints_ordering_dropdown"),
+        Output("checkpoints-ordering-dropdown", "options"),
+        Input({"type": "datetime-column-radioItems", "index": ALL}, "value"),
+        State({"type": "datetime-column-radioItems", "index": ALL}, "id")
+    )
+    
+def callback_checkpoints_ordering_radioItems(app, dataset):
+    """
+    Update checkpoints ordering radioItems on client, if there is no any checkpoint in dropdown, disable radioItems.
+    """
+    
+    app.clientside_callback(
+        ClientsideFunction(namespace="filter", function_name="update_checkpoints_ordering_radioItems"),
         Output("checkpoints-ordering-radioItems", "options"),
         Output("checkpoints-ordering-radioItems", "value"),
         Input("checkpoints-ordering-dropdown", "value")
     )
-    def update_checkpoints_ordering_radioItems(checkpoints):
-        if checkpoints is None or len(checkpoints) <= 1:
-            options = [{"label": "ใช่", "value": 1, "disabled": True},
-                       {"label": "ไม่ใช่", "value": 0, "disabled": True}]
-        else:
-            options = [{"label": "ใช่", "value": 1},
-                       {"label": "ไม่ใช่", "value": 0}]
-        
-        return options, 1
     
-def callback_all_datetime_columns_radioItems(app, days):
+def callback_all_datetime_columns_radioItems(app, dataset):
     """
-    Update all datetime columns radioItems by "all-datetime-columns" radioItems.
+    Update all datetime columns radioItems by "all-datetime-columns" radioItems on client.
     """
     
-    @app.callback(
+    app.clientside_callback(
+        ClientsideFunction(namespace="filter", function_name="update_all_datetime_columns_radioItems"),
         Output({"type": "datetime-column-radioItems", "index": ALL}, "options"),
         Output({"type": "datetime-column-radioItems", "index": ALL}, "value"),
         Input("all-datetime-columns", "value")
     )
-    def update_all_datetime_columns_radioItems(all_datetime):
-        total_radioItems = 10
-        
-        if all_datetime == 2:
-            options = [
-                {"label": "มี / ไม่มี", "value": 2},
-                {"label": "มี", "value": 1},
-                {"label": "ไม่มี", "value": 0}
-            ]
-        else:
-            options = [
-                {"label": "มี / ไม่มี", "value": 2, "disabled": True},
-                {"label": "มี", "value": 1, "disabled": True},
-                {"label": "ไม่มี", "value": 0, "disabled": True}
-            ]
-            
-        return [options] * total_radioItems, [all_datetime] * total_radioItems
     
-def callback_time_between_checkpoints_main_division(app, days):
+def callback_time_between_checkpoints_main_division(app, dataset):
     """
     Update time between checkpoints main division.
     """
@@ -304,12 +549,13 @@ def callback_time_between_checkpoints_main_division(app, days):
                 
         return main_div
 
-def callback_time_between_checkpoints_dropdown(app, days):
+def callback_time_between_checkpoints_dropdown(app, dataset):
     """
-    Update options in start and end dropdown of time between checkpoints dropdown.
+    Update options in start and end dropdown of time between checkpoints dropdown on client.
     """
     
-    @app.callback(
+    app.clientside_callback(
+        ClientsideFunction(namespace="filter", function_name="update_time_between_checkpoints_dropdown"),
         Output({"type": "start-checkpoint-dropdown", "index": MATCH}, "options"),
         Output({"type": "end-checkpoint-dropdown", "index": MATCH}, "options"),
         Output({"type": "start-checkpoint-dropdown", "index": MATCH}, "value"),
@@ -321,48 +567,3 @@ def callback_time_between_checkpoints_dropdown(app, days):
         Input({"type": "end-checkpoint-dropdown", "index": ALL}, "value"),
         State({"type": "start-checkpoint-dropdown", "index": MATCH}, "id"),
     )
-    def update_time_between_checkpoints_dropdown(checkpoints, start_checkpoint, end_checkpoint,
-                                                 start_checkpoints, end_checkpoints, dropdown_id):
-        def generate_checkpoint_dropdowns(checkpoints, opposite_checkpoint,
-                                          start_checkpoints, end_checkpoints,
-                                          dropdown_id):
-            """
-            Generate options for each checkpoint dropdown.
-            Change checkpoint dropdown values to None if the selected checkpoint is not 1.
-            """
-            
-            if opposite_checkpoint != None:
-                if {"label": opposite_checkpoint, "value": opposite_checkpoint} in checkpoints:
-                    checkpoints.remove({"label": opposite_checkpoint, "value": opposite_checkpoint})
-                    
-                for index, value in enumerate(start_checkpoints):
-                    if index == dropdown_id["index"]:
-                        continue
-                    
-                    if {"label": end_checkpoints[index], "value": end_checkpoints[index]} in checkpoints:
-                        if start_checkpoints[index] == opposite_checkpoint:
-                            checkpoints.remove({"label": end_checkpoints[index], "value": end_checkpoints[index]})
-                            
-                    if {"label": start_checkpoints[index], "value": start_checkpoints[index]} in checkpoints:
-                        if end_checkpoints[index] == opposite_checkpoint:
-                            checkpoints.remove({"label": start_checkpoints[index], "value": start_checkpoints[index]})
-            
-            return checkpoints
-        
-        start_dropdown = generate_checkpoint_dropdowns(checkpoints.copy(), end_checkpoint,
-                                                       start_checkpoints, end_checkpoints, dropdown_id)
-        
-        end_dropdown = generate_checkpoint_dropdowns(checkpoints.copy(), start_checkpoint,
-                                                     start_checkpoints, end_checkpoints, dropdown_id)
-        
-        if {"label": start_checkpoint, "value": start_checkpoint} not in start_dropdown:
-            start_value = None
-        else:
-            start_value = start_checkpoint
-        
-        if {"label": end_checkpoint, "value": end_checkpoint} not in end_dropdown:
-            end_value = None
-        else:
-            end_value = end_checkpoint
-            
-        return start_dropdown, end_dropdown, start_value, end_value
\ No newline at end of file
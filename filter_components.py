@@ -1,7 +1,9 @@
 import dash_html_components as html
 import dash_core_components as dcc
 import dash_table as table
+import uuid
 from datetime import timedelta
+from data_preprocessing import data_columns
 
 
 # Checklist and RadioItems labelStyle
@@ -10,12 +12,12 @@ checklist_labelStyle = {"marginRight": 8,
 
 marginBottom = {"marginBottom": 10}
 
-def generate_date_picker_range(label, days):
+def generate_date_picker_range(label, dataset):
     """
     Generate date picker using DatePickerRange from Dash Core Components.
     """
     
-    dates = list(days.keys())
+    dates = dataset["dates"]
     
     return html.Div([
         html.Label(children=label,
@@ -30,9 +32,54 @@ def generate_date_picker_range(label, days):
             minimum_nights=0,
             initial_visible_month=min(dates),
             display_format="D/M/YYYY"
-        )
+        ),
+        
+        # Version of dataset that date picker bounds come from, checked periodically for reloaded datasets
+        dcc.Store(id="dataset-version", data=dataset.get("version")),
+        dcc.Interval(id="dataset-version-interval", interval=60 * 1000)
     ], style=marginBottom)
     
+def generate_session_store():
+    """
+    Generate store of session id, a new id on every page load, so requests of a page can supersede each other.
+    """
+    
+    return dcc.Store(id="session-id", data=str(uuid.uuid4()))
+    
+def generate_flow_graphs():
+    """
+    Generate process flow graphs of filtered visitors using Graph from Dash Core Components.
+    """
+    
+    graph_style = {"display": "inline-block",
+                   "width": "33%",
+                   "verticalAlign": "top"}
+    
+    return html.Div([
+        # Transitions between checkpoints graph
+        dcc.Graph(id="transitions-graph", style=graph_style),
+        
+        # Time between consecutive checkpoints graph
+        dcc.Graph(id="durations-graph", style=graph_style),
+        
+        # Time between consecutive checkpoints per clinic and hour graph
+        dcc.Graph(id="clinic-hour-graph", style=graph_style)
+    ], style={"borderTop": "thin lightgrey solid",
+              "marginTop": 10})
+    
+def generate_debug_overlay():
+    """
+    Generate division that shows timing of stages of the latest table update.
+    """
+    
+    return html.Pre(
+        id="debug-overlay",
+        style={
+            "fontSize": 11,
+            "color": "grey"
+        }
+    )
+    
 def generate_total_visitors_label():
     """
     Generate total visitors label using Label from Dash Html Components.
@@ -46,17 +93,20 @@ def generate_total_visitors_label():
         }
     )
     
-def generate_data_table(days):
+def generate_data_table(dataset):
     """
-    Generate data table using Dash DataTable
+    Generate data table using Dash DataTable with paging and sorting on server.
     """
     
-    columns = days.get(list(days.keys())[0]).columns
-    
     return table.DataTable(
         id="data-table",
-        columns=[{"name": col, "id": col} for col in columns],
+        columns=[{"name": col, "id": col} for col in data_columns],
+        page_current=0,
         page_size=5,
+        page_action="custom",
+        sort_action="custom",
+        sort_mode="single",
+        sort_by=[],
         style_cell={
             "whiteSpace": "normal",
             "height": "auto",
@@ -66,21 +116,19 @@ def generate_data_table(days):
         },
         style_cell_conditional=[
             {"if": {"column_id": dt_column},
-             "width": "6%"} for dt_column in [col for col in columns if col.endswith("_dt")]
+             "width": "6%"} for dt_column in [col for col in data_columns if col.endswith("_dt")]
         ] + [{"if": {"column_id": "clinic"},
               "width": "10%"},
              {"if": {"column_id": "sex"},
               "width": "2%"}]
     )
     
-def generate_possible_values_checklist(label, id, days, column):
+def generate_possible_values_checklist(label, id, dataset, column):
     """
     Generate possible values selection using Checklist from Dash Core Components.
     """
     
-    values = set()
-    for day in days.values():
-        values = values.union(day[column].unique())
+    values = set(dataset["visits"][column].unique())
     
     return html.Div([
         html.Label(children=label),
@@ -154,6 +202,16 @@ def generate_clinics_checklist(label):
         )
     ], style=marginBottom)
     
+def generate_checkpoints_preview_label():
+    """
+    Generate label of number of visitors with selected checkpoints using Label from Dash Html Components.
+    """
+    
+    return html.Label(
+        id="checkpoints-preview-label",
+        style={"color": "grey"}
+    )
+    
 def generate_require_datetime_radioItems(label, id):
     """
     Generate require data in datetime columns or not selection using RadioItems from Dash Core Components.
@@ -0,0 +1,305 @@
+import numpy as np
+import pandas as pd
+from bisect import bisect_left, bisect_right
+from data_preprocessing import checkpoint_columns
+
+# Number of nanoseconds in one hour
+NS_PER_HOUR = 3600 * 10 ** 9
+
+# Integer value of NaT in int64 nanosecond arrays
+NAT = np.iinfo(np.int64).min
+
+def date_range_days(dataset, start_date, end_date):
+    """
+    Find first and last index of dataset["dates"] with date between start date and end date,
+    dates between first and last are dataset["dates"][first:last].
+    """
+    
+    start_date = pd.Timestamp(start_date).date()
+    end_date = pd.Timestamp(end_date).date()
+    
+    if start_date > end_date:
+        tmp_end = start_date
+        start_date = end_date
+        end_date = tmp_end
+    
+    return bisect_left(dataset["dates"], start_date), bisect_right(dataset["dates"], end_date)
+
+def date_range_offsets(dataset, start_date, end_date, offsets="offsets"):
+    """
+    Find first and last row offsets of visits, or of rows in other frame with offsets of each date,
+    with date between start date and end date. Dates without data are skipped.
+    """
+    
+    first, last = date_range_days(dataset, start_date, end_date)
+    
+    return int(dataset[offsets][first]), int(dataset[offsets][last])
+
+def take_rows(visits, positions, columns):
+    """
+    Gather rows at positions of columns of visits one column at a time, index of the result is positions.
+    Indexing rows and columns of visits together would consolidate blocks of the memory-mapped frame into private memory.
+    """
+
+    return pd.DataFrame({col: visits[col].array.take(positions) for col in columns}, index=positions)
+
+def datetime_matrix(filtered, columns):
+    """
+    Stack datetime columns into 2-D int64 nanosecond matrix and mask of NaT positions.
+    Columns are stacked one at a time, converting a frame of several columns would consolidate and copy its blocks.
+    """
+
+    values = np.empty((len(filtered), len(columns)), dtype=np.int64)
+    for index, col in enumerate(columns):
+        values[:, index] = filtered[col].to_numpy(dtype="datetime64[ns]").view("int64")
+
+    return values, values == NAT
+
+def time_between_checkpoints_mask(filtered, rules):
+    """
+    Generate mask of visitors with time between checkpoints between min and max time of every
+    (start checkpoint, end checkpoint, min time, max time) rule.
+    Visitors that do not have one of the checkpoints pass the rule.
+    """
+
+    if len(rules) == 0:
+        return np.ones(len(filtered), dtype=bool)
+
+    starts, ends, min_times, max_times = zip(*rules)
+    start_values, start_nat = datetime_matrix(filtered, starts)
+    end_values, end_nat = datetime_matrix(filtered, ends)
+
+    # All rules are computed at once, one column per rule
+    time_btw = np.abs(start_values - end_values) / NS_PER_HOUR
+    in_range = (time_btw >= np.array(min_times, dtype=float)) & (time_btw < np.array(max_times, dtype=float))
+
+    return (in_range | start_nat | end_nat).all(axis=1)
+
+def checkpoints_ordering_mask(filtered, checkpoints):
+    """
+    Generate mask of visitors that pass checkpoints in the same order as the given checkpoints.
+    Checkpoints without datetime are skipped and equal datetimes are counted as ordered.
+    """
+
+    values, nat = datetime_matrix(filtered, checkpoints)
+
+    # NaT is the smallest int64 value, so running maximum only carries the latest existing checkpoint
+    latest = np.maximum.accumulate(values, axis=1)[:, :-1]
+
+    return (nat[:, 1:] | (values[:, 1:] >= latest)).all(axis=1)
+
+def category_mask(column, values):
+    """
+    Generate mask of rows in categorical column with value in values by looking up category codes.
+    """
+
+    selected = np.zeros(len(column.cat.categories) + 1, dtype=bool)
+    codes = column.cat.categories.get_indexer(list(values))
+    selected[codes[codes >= 0]] = True
+
+    # Missing values have code -1, which looks up the last entry that is never selected
+    return selected[column.cat.codes.to_numpy()]
+
+def appointment_mask(filtered, appointment):
+    """
+    Generate mask of visitors with appointment (1) or walk-in (0) in appointment.
+    """
+
+    if len(appointment) == 0:
+        return np.zeros(len(filtered), dtype=bool)
+    if 1 not in appointment:
+        return ~filtered["is_appointment"].to_numpy()
+    if 0 not in appointment:
+        return filtered["is_appointment"].to_numpy()
+
+    return np.ones(len(filtered), dtype=bool)
+
+def presence_bits(state):
+    """
+    Encode datetime column radioItems of filter state into (required mask, required set) of checkpoints_mask bits.
+    Checkpoints that must be present (1) have their bit in both, checkpoints that must be absent (0) only in required mask.
+    """
+
+    required_mask = 0
+    required_set = 0
+    for col, value in state["datetime_columns"].items():
+        if value in [0, 1]:
+            required_mask |= 1 << checkpoint_columns.index(col)
+            required_set |= value << checkpoint_columns.index(col)
+
+    return required_mask, required_set
+
+def presence_mask(filtered, params):
+    """
+    Generate mask of visitors that have and do not have checkpoints of datetime column radioItems
+    with one comparison of checkpoints_mask bits.
+    """
+
+    required_mask, required_set = params
+
+    return (filtered["checkpoints_mask"].to_numpy() & required_mask) == required_set
+
+def range_mask(filtered, params):
+    """
+    Generate mask of visitors with value of column between min and max,
+    max is included only if include_max is True. A missing bound, e.g. a cleared input, selects nothing.
+    """
+
+    col, min_value, max_value, include_max = params
+    if min_value is None or max_value is None:
+        return np.zeros(len(filtered), dtype=bool)
+
+    values = filtered[col].to_numpy()
+
+    if include_max:
+        return (values >= min_value) & (values <= max_value)
+
+    return (values >= min_value) & (values < max_value)
+
+def indexed_range_mask(dataset, start, stop, params):
+    """
+    Generate mask of visits rows between start and stop with value of column between min and max
+    using sorted index of the column. Rows of each date that match are one contiguous range of the index,
+    so rows that can not match are never scanned. A missing bound selects nothing, like range_mask.
+    """
+
+    col, min_value, max_value, include_max = params
+    order, values = dataset["range_indexes"][col]
+    offsets = dataset["offsets"]
+
+    mask = np.zeros(stop - start, dtype=bool)
+    if min_value is None or max_value is None:
+        return mask
+
+    # Bounds of float32 columns are rounded to float32 like comparisons in range_mask, e.g. 1.3 hours matches 1.3
+    if values.dtype.kind == "f":
+        min_value, max_value = values.dtype.type(min_value), values.dtype.type(max_value)
+
+    for day in range(np.searchsorted(offsets, start), np.searchsorted(offsets, stop)):
+        day_start, day_stop = offsets[day], offsets[day + 1]
+        day_values = values[day_start:day_stop]
+        first = np.searchsorted(day_values, min_value, side="left")
+        last = np.searchsorted(day_values, max_value, side="right" if include_max else "left")
+        mask[order[day_start + first:day_start + last] - start] = True
+
+    return mask
+
+def ordering_mask(filtered, params):
+    """
+    Generate mask of visitors with (isOrdered is 1) or without desired checkpoints ordering.
+    """
+
+    checkpoints, isOrdered = params
+    ordered = checkpoints_ordering_mask(filtered, checkpoints)
+
+    return ordered if isOrdered == 1 else ~ordered
+
+def predicates(state):
+    """
+    Split filter state into (name, params, mask function) predicates of filter components.
+    Filter fields that select every visitor are skipped.
+    """
+
+    result = []
+
+    if sorted(state["appointment"]) != [0, 1]:
+        result.append(("appointment", state["appointment"], appointment_mask))
+
+    required_mask, required_set = presence_bits(state)
+    if required_mask != 0:
+        result.append(("presence", [required_mask, required_set], presence_mask))
+
+    result.append(("gender", state["gender"], lambda filtered, values: category_mask(filtered["gender"], values)))
+    result.append(("final_status", state["final_status"], lambda filtered, values: category_mask(filtered["final_status"], values)))
+    result.append(("clinics", state["clinics"], lambda filtered, values: category_mask(filtered["clinic"], values)))
+    result.append(("age", ["age", *state["age"], True], range_mask))
+    result.append(("start_time", ["start_hour", *state["start_time"], False], range_mask))
+    result.append(("total_time", ["total_time", *state["total_time"], False], range_mask))
+
+    for rule in state["btw"]:
+        result.append(("btw", rule, lambda filtered, rule: time_between_checkpoints_mask(filtered, [rule])))
+
+    if state["checkpoints"] is not None:
+        result.append(("ordering", [state["checkpoints"], state["isOrdered"]], ordering_mask))
+
+    return result
+
+def state_mask(filtered, state, dataset=None, start=0):
+    """
+    Generate mask of visitors that pass every predicate of filter state.
+    If filtered is visits[start:start + len(filtered)] of dataset with range indexes, range filters use the indexes.
+    """
+
+    mask = np.ones(len(filtered), dtype=bool)
+    for name, params, predicate in predicates(state):
+        if name in range_predicates and dataset is not None and "range_indexes" in dataset:
+            mask &= indexed_range_mask(dataset, start, start + len(filtered), params)
+        else:
+            mask &= predicate(filtered, params)
+
+    return mask
+
+def day_partitions(dataset, start, stop):
+    """
+    Split rows start:stop of visits into (start, stop) row ranges of each date.
+    """
+
+    bounds = np.unique(np.clip(dataset["offsets"], start, stop))
+
+    return [(int(first), int(last)) for first, last in zip(bounds[:-1], bounds[1:])]
+
+# Predicates of range filters that can use sorted indexes
+range_predicates = ["age", "start_time", "total_time"]
+
+def presence_count(dataset, state):
+    """
+    Count visitors between start date and end date of filter state that have and do not have checkpoints
+    of datetime column radioItems from counts of each checkpoints_mask pattern, without other filters.
+    """
+
+    first, last = date_range_days(dataset, state["start_date"], state["end_date"])
+    counts = dataset["pattern_counts"][first:last].sum(axis=0)
+    required_mask, required_set = presence_bits(state)
+    patterns = np.arange(len(counts))
+
+    return int(counts[(patterns & required_mask) == required_set].sum())
+
+# Predicates that cube of visitors can evaluate on its own columns
+cube_predicates = ["appointment", "presence", "gender", "final_status", "clinics", "start_time"]
+
+def cube_count(dataset, state):
+    """
+    Count filtered visitors from cube of visitors.
+    Return None if the cube does not cover filter state, i.e. there are between checkpoints or ordering rules,
+    or age range excludes some visitors of the selected dates or total time range excludes some visitors.
+    """
+
+    if len(state["btw"]) > 0:
+        return None
+    if state["checkpoints"] is not None and (len(state["checkpoints"]) > 1 or state["isOrdered"] != 1):
+        return None
+
+    # A missing bound of a range filter selects nothing, like range_mask
+    if None in state["age"] + state["start_time"] + state["total_time"]:
+        return 0
+
+    min_age, max_age = state["age"]
+    min_total_time, max_total_time = state["total_time"]
+    first, last = date_range_days(dataset, state["start_date"], state["end_date"])
+    age_ranges = dataset["day_age_ranges"][first:last]
+    if np.isnan(age_ranges).any():
+        return None
+    if len(age_ranges) > 0 and (min_age > age_ranges[:, 0].min() or max_age < age_ranges[:, 1].max()):
+        return None
+    if min_total_time > dataset["total_time_range"][0] or max_total_time <= dataset["total_time_range"][1]:
+        return None
+
+    start, stop = date_range_offsets(dataset, state["start_date"], state["end_date"], "cube_offsets")
+    cube = dataset["cube"].iloc[start:stop]
+
+    mask = np.ones(len(cube), dtype=bool)
+    for name, params, predicate in predicates(state):
+        if name in cube_predicates:
+            mask &= predicate(cube, params)
+
+    return int(cube["count"].to_numpy()[mask].sum())
@@ -1,11 +1,12 @@
 import dash_html_components as html
 from filter_components import *
+import metrics
 
 datetime_style = {"display": "inline-block",
                   "width": "50%",
                   "verticalAlign": "bottom"}
 
-def filter_layout(days):
+def filter_layout(dataset):
     """
     Main layout of filter dashboard.
     """
@@ -14,7 +15,7 @@ def filter_layout(days):
         # Date picker range
         generate_date_picker_range(
             label="Date:",
-            days=days
+            dataset=dataset
         ),
         
         # Filter fields division
@@ -25,7 +26,7 @@ def filter_layout(days):
                 generate_possible_values_checklist(
                     label="Gender:",
                     id="gender-checklist",
-                    days=days,
+                    dataset=dataset,
                     column="gender"
                 ),
                 
@@ -33,7 +34,7 @@ def filter_layout(days):
                 generate_possible_values_checklist(
                     label="Final Status:",
                     id="final-status-checklist",
-                    days=days,
+                    dataset=dataset,
                     column="final_status"
                 ),
                 
@@ -87,6 +88,9 @@ def filter_layout(days):
                 html.Div([
                     # First datetime column radioItems division
                     html.Div([
+                        # Number of visitors with selected checkpoints
+                        generate_checkpoints_preview_label(),
+                        
                         # All datetime column radioItems
                         generate_require_datetime_radioItems(
                             label="All Datetime Columns:",
@@ -214,10 +218,19 @@ def filter_layout(days):
         
         # Data table division
         html.Div([
+            # Session id of requests of this page
+            generate_session_store(),
+            
             # Total visitors label
             generate_total_visitors_label(),
             
             # Data table
-            generate_data_table(days=days)
-        ])
+            generate_data_table(dataset=dataset),
+            
+            # Timing of the latest table update, only if debug overlay is enabled
+            *([generate_debug_overlay()] if metrics.debug_overlay else [])
+        ]),
+        
+        # Process flow graphs division
+        generate_flow_graphs()
     ])
\ No newline at end of file
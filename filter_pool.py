@@ -0,0 +1,119 @@
+import concurrent.futures
+import multiprocessing
+import threading
+import numpy as np
+from data_store import read_store
+from data_preprocessing import build_range_indexes
+from filter_engine import date_range_offsets, day_partitions, state_mask
+from filter_cache import filter_key
+
+# Process or thread pool that filters visitors of each date, None when visitors are filtered on the request thread
+pool = None
+
+# Modes of pool that start_pool accepts
+pool_modes = ["process", "thread"]
+
+# Mode of pool, "process" or "thread"
+mode = None
+
+# (filter key, futures) of the latest request of each session, futures of superseded requests are cancelled
+session_futures = dict()
+session_lock = threading.Lock()
+
+# Datasets mapped from the store by a worker process, keyed by dataset version
+worker_datasets = dict()
+
+def start_pool(workers=None, pool_mode="process"):
+    """
+    Start pool of workers, e.g. before the server starts serving requests.
+    Process workers map the same store as the server, so visits are shared through the OS page cache instead of copied.
+    Thread workers filter the dataset of the server directly and rely on NumPy and pandas releasing the GIL
+    in vectorized operations.
+    Raise ValueError if pool mode is not one of pool_modes.
+    """
+
+    global pool, mode
+
+    if pool_mode not in pool_modes:
+        raise ValueError(f"Unknown pool mode {pool_mode!r}, expected one of {', '.join(pool_modes)}")
+
+    if pool_mode == "thread":
+        pool = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="filter")
+    else:
+        # Forked workers start at the first task, so start them now, before request threads exist
+        context = multiprocessing.get_context("fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn")
+        pool = concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=context)
+        pool.submit(int).result()
+    mode = pool_mode
+
+    return pool
+
+def pool_available(dataset):
+    """
+    Check whether visitors of dataset can be filtered in the pool, process workers need a stored dataset.
+    """
+
+    return pool is not None and (mode == "thread" or dataset.get("store_dir") is not None)
+
+def process_day_positions(store_dir, version, start, stop, state):
+    """
+    Filter rows start:stop of stored dataset in worker process, return row positions of filtered visitors.
+    Range filters use sorted indexes that the worker builds once per version.
+    Raise concurrent.futures.CancelledError if a reload has already removed the store of the version.
+    """
+
+    dataset = worker_datasets.get(version)
+    if dataset is None:
+        dataset = read_store(store_dir, version)
+        if dataset is None:
+            # Request of the old version is dropped, the next request filters the new version
+            raise concurrent.futures.CancelledError(f"Store {version} has been removed by a reload")
+        dataset["range_indexes"] = build_range_indexes(dataset)
+        # Keep only the latest version, older stores are removed after a reload
+        worker_datasets.clear()
+        worker_datasets[version] = dataset
+
+    return start + np.flatnonzero(state_mask(dataset["visits"].iloc[start:stop], state, dataset, start))
+
+def thread_day_positions(dataset, start, stop, state):
+    """
+    Filter rows start:stop of dataset in worker thread, return row positions of filtered visitors.
+    """
+
+    return start + np.flatnonzero(state_mask(dataset["visits"].iloc[start:stop], state, dataset, start))
+
+def pool_filter_positions(dataset, state, session=None):
+    """
+    Filter visitors of each date in pool and merge row positions of surviving visitors in date order.
+    A new request of the same session cancels days of its superseded request that have not started yet
+    and raises concurrent.futures.CancelledError in the superseded request. Days that workers have already started
+    run to the end and their positions are dropped, so a superseded request holds a worker for at most one day.
+    Requests of the same session with the same filter state share their futures.
+    Masks of filter components are not cached here, as mask_cache is keyed by date range of the request and process
+    workers do not share memory with the server, only merged positions are cached by the caller.
+    """
+
+    key = filter_key(state, dataset["version"])
+    with session_lock:
+        previous_key, futures = session_futures.get(session, (None, None))
+        if session is None or previous_key != key:
+            if futures is not None:
+                for future in futures:
+                    future.cancel()
+
+            start, stop = date_range_offsets(dataset, state["start_date"], state["end_date"])
+            if mode == "thread":
+                futures = [pool.submit(thread_day_positions, dataset, first, last, state)
+                           for first, last in day_partitions(dataset, start, stop)]
+            else:
+                futures = [pool.submit(process_day_positions, dataset["store_dir"], dataset["version"], first, last, state)
+                           for first, last in day_partitions(dataset, start, stop)]
+            if session is not None:
+                session_futures[session] = (key, futures)
+
+    try:
+        return np.concatenate([future.result() for future in futures] + [np.empty(0, dtype=np.int64)])
+    finally:
+        with session_lock:
+            if session in session_futures and session_futures[session][1] is futures:
+                del session_futures[session]
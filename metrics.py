@@ -0,0 +1,167 @@
+import json
+import logging
+import os
+import threading
+import time
+import flask
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# Requests slower than this many seconds are logged with their filter inputs, e.g. SLOW_QUERY_SECONDS=0.5
+slow_query_seconds = float(os.environ.get("SLOW_QUERY_SECONDS", 1.0))
+slow_query_log = logging.getLogger("slow_query")
+
+# Show timing of the latest "data-table" update below the table, e.g. DEBUG_OVERLAY=1
+debug_overlay = os.environ.get("DEBUG_OVERLAY") == "1"
+
+# [seconds, calls, rows] of each (operation, stage)
+stage_totals = dict()
+
+# Number of bytes of responses of each path
+response_bytes = dict()
+
+# Latest trace of each (session, operation) for debug overlay
+last_traces = OrderedDict()
+max_last_traces = 1024
+
+lock = threading.Lock()
+
+# Trace of the operation that runs on the current thread
+local = threading.local()
+
+def record(operation, stage, seconds, rows=None):
+    """
+    Add time and rows of one stage to stage totals.
+    """
+
+    with lock:
+        totals = stage_totals.setdefault((operation, stage), [0.0, 0, 0])
+        totals[0] += seconds
+        totals[1] += 1
+        totals[2] += rows or 0
+
+@contextmanager
+def trace(operation, inputs=None, session=None):
+    """
+    Trace stages of operation that runs on the current thread, e.g.
+    with trace("update_data_table", inputs=state): ...
+    Operations slower than slow_query_seconds are logged with their inputs.
+    """
+
+    current = {"operation": operation, "inputs": inputs, "stages": [], "seconds": None}
+    parent = getattr(local, "trace", None)
+    local.trace = current
+    start = time.perf_counter()
+    try:
+        yield current
+    finally:
+        local.trace = parent
+        current["seconds"] = time.perf_counter() - start
+        record(operation, "total", current["seconds"])
+
+        if session is not None:
+            with lock:
+                last_traces[(session, operation)] = current
+                last_traces.move_to_end((session, operation))
+                while len(last_traces) > max_last_traces:
+                    last_traces.popitem(last=False)
+
+        if current["seconds"] > slow_query_seconds:
+            slow_query_log.warning(json.dumps(current, default=str))
+
+@contextmanager
+def stage(name):
+    """
+    Time stage of traced operation, rows that the stage produces can be set in the yielded dictionary, e.g.
+    with stage("filter") as info: info["rows"] = len(positions)
+    Stages outside of traced operations are not timed.
+    """
+
+    info = {"stage": name, "seconds": None, "rows": None}
+    start = time.perf_counter()
+    try:
+        yield info
+    finally:
+        current = getattr(local, "trace", None)
+        if current is not None:
+            info["seconds"] = time.perf_counter() - start
+            current["stages"].append(info)
+            record(current["operation"], name, info["seconds"], info["rows"])
+
+def last_trace(session, operation):
+    """
+    Return latest trace of operation of session or None.
+    """
+
+    with lock:
+        return last_traces.get((session, operation))
+
+def format_trace(current):
+    """
+    Format trace into lines of stage, milliseconds and rows.
+    """
+
+    lines = [f"{current['operation']}: {current['seconds'] * 1000:.1f} ms"]
+    for info in current["stages"]:
+        rows = "" if info["rows"] is None else f" {info['rows']} rows"
+        lines.append(f"  {info['stage']}: {info['seconds'] * 1000:.1f} ms{rows}")
+
+    return "\n".join(lines)
+
+def prometheus_text(caches=None):
+    """
+    Generate metrics in Prometheus text format from stage totals, response sizes and stats of caches.
+    """
+
+    with lock:
+        totals = sorted(stage_totals.items())
+        sizes = sorted(response_bytes.items())
+
+    lines = ["# HELP dashboard_stage_seconds Time spent in each stage of operations.",
+             "# TYPE dashboard_stage_seconds summary"]
+    for (operation, stage_name), (seconds, calls, rows) in totals:
+        labels = f'operation="{operation}",stage="{stage_name}"'
+        lines.append(f"dashboard_stage_seconds_sum{{{labels}}} {seconds}")
+        lines.append(f"dashboard_stage_seconds_count{{{labels}}} {calls}")
+
+    lines += ["# HELP dashboard_stage_rows_total Rows produced by each stage of operations.",
+              "# TYPE dashboard_stage_rows_total counter"]
+    for (operation, stage_name), (seconds, calls, rows) in totals:
+        lines.append(f'dashboard_stage_rows_total{{operation="{operation}",stage="{stage_name}"}} {rows}')
+
+    lines += ["# HELP dashboard_response_bytes_total Bytes of serialized responses.",
+              "# TYPE dashboard_response_bytes_total counter"]
+    for path, size in sizes:
+        lines.append(f'dashboard_response_bytes_total{{path="{path}"}} {size}')
+
+    stats = {name: cache.stats() for name, cache in (caches or dict()).items()}
+    for key, kind in [("entries", "gauge"), ("bytes", "gauge"), ("hits", "counter"), ("misses", "counter")]:
+        metric = f"dashboard_cache_{key}" + ("_total" if kind == "counter" else "")
+        lines.append(f"# TYPE {metric} {kind}")
+        for name in sorted(stats):
+            lines.append(f'{metric}{{cache="{name}"}} {stats[name][key]}')
+
+    return "\n".join(lines) + "\n"
+
+def register_metrics_endpoint(server, caches=None):
+    """
+    Register "/metrics" endpoint on Flask server and time every Dash callback request,
+    including serialization of its response.
+    """
+
+    @server.before_request
+    def start_request_timer():
+        flask.g.request_start = time.perf_counter()
+
+    @server.after_request
+    def record_request_time(response):
+        if flask.request.path.startswith("/_dash-update-component") and "request_start" in flask.g:
+            record("request", flask.request.path, time.perf_counter() - flask.g.request_start)
+            with lock:
+                response_bytes[flask.request.path] = response_bytes.get(flask.request.path, 0) + (response.content_length or 0)
+
+        return response
+
+    @server.route("/metrics")
+    def metrics():
+        return flask.Response(prometheus_text(caches), mimetype="text/plain; version=0.0.4")
@@ -0,0 +1,238 @@
+import math
+import os
+import sqlite3
+import threading
+import numpy as np
+import pandas as pd
+from data_preprocessing import data_columns
+from filter_engine import NS_PER_HOUR, NAT, presence_bits
+import coalesce
+
+# Name of database file in the store directory of a dataset version
+database_filename = "visits.sqlite"
+
+# Columns of visits table besides row and date, datetime columns are int64 nanoseconds and NaT is NULL
+database_columns = data_columns + ["start_hour", "total_time", "is_appointment", "checkpoints_mask"]
+
+# Columns that are float32 in memory, bounds are rounded to float32 so SQL compares like NumPy
+float32_columns = ["start_hour", "total_time"]
+
+# Connections of each thread, keyed by database path
+local = threading.local()
+
+def database_path(dataset):
+    """
+    Generate path of database file of stored dataset.
+    """
+
+    return os.path.join(dataset["store_dir"], dataset["version"], database_filename)
+
+def sql_values(column):
+    """
+    Convert column into list of Python values for SQLite, missing values become None.
+    """
+
+    if column.dtype.kind == "M":
+        values = column.to_numpy(dtype="datetime64[ns]").view("int64").astype(object)
+    elif isinstance(column.dtype, pd.CategoricalDtype):
+        values = column.astype(object).to_numpy()
+    else:
+        values = column.to_numpy().astype(object)
+    values[column.isna().to_numpy()] = None
+
+    return values.tolist()
+
+def write_database(dataset, path):
+    """
+    Write visits of dataset into visits table of SQLite database, one date at a time.
+    Row of each visitor is its position in dataset["visits"], so both backends return the same visitors.
+    """
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    connection = sqlite3.connect(tmp_path)
+    try:
+        columns = ", ".join(f'"{col}"' for col in database_columns)
+        connection.execute(f'CREATE TABLE visits ("row" INTEGER PRIMARY KEY, "date" TEXT, {columns})')
+
+        visits = dataset["visits"]
+        offsets = dataset["offsets"]
+        placeholders = ", ".join(["?"] * (len(database_columns) + 2))
+        for index, d in enumerate(dataset["dates"]):
+            day = visits.iloc[offsets[index]:offsets[index + 1]]
+            rows = zip(range(offsets[index], offsets[index + 1]), [d.isoformat()] * len(day),
+                       *[sql_values(day[col]) for col in database_columns])
+            connection.executemany(f"INSERT INTO visits VALUES ({placeholders})", rows)
+
+        connection.execute('CREATE INDEX visits_date ON visits ("date")')
+        connection.commit()
+    finally:
+        connection.close()
+
+    os.replace(tmp_path, path)
+
+def attach_database(dataset):
+    """
+    Write database of stored dataset if it does not exist yet and make callbacks query it.
+    """
+
+    path = database_path(dataset)
+    if not os.path.exists(path):
+        write_database(dataset, path)
+
+    dataset["database"] = path
+    dataset["backend"] = "sqlite"
+
+    return dataset
+
+def connect(path):
+    """
+    Return read-only connection to database of the current thread.
+    """
+
+    connections = local.__dict__.setdefault("connections", dict())
+    if path not in connections:
+        connections[path] = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        # Abort queries of requests that a newer request of the same session has superseded
+        connections[path].set_progress_handler(coalesce.is_superseded, 10000)
+
+    return connections[path]
+
+def execute(dataset, sql, params):
+    """
+    Run query on database of dataset and fetch all rows, raise coalesce.Superseded if the request is superseded.
+    """
+
+    try:
+        return connect(dataset["database"]).execute(sql, params).fetchall()
+    except sqlite3.OperationalError:
+        if coalesce.is_superseded():
+            raise coalesce.Superseded()
+        raise
+
+def quote(column):
+    """
+    Quote column name of visits table, names that come from filter fields must be known columns.
+    """
+
+    if column not in database_columns:
+        raise ValueError(f"Unknown column {column!r}")
+
+    return f'"{column}"'
+
+def in_clause(column, values):
+    """
+    Compile selection of values of column, an empty selection selects nothing.
+    """
+
+    if len(values) == 0:
+        return "0", []
+
+    return f'{quote(column)} IN ({", ".join(["?"] * len(values))})', list(values)
+
+def range_clause(column, min_value, max_value, include_max):
+    """
+    Compile range of column like range_mask, missing bounds select nothing.
+    """
+
+    if column in float32_columns:
+        min_value, max_value = [None if value is None else float(np.float32(value)) for value in [min_value, max_value]]
+
+    return f'{quote(column)} >= ? AND {quote(column)} {"<=" if include_max else "<"} ?', [min_value, max_value]
+
+def compile_state(state):
+    """
+    Compile filter state into WHERE clause and its parameters, clauses follow predicates of filter_engine.
+    """
+
+    clauses = [('"date" BETWEEN ? AND ?', [state["start_date"], state["end_date"]])]
+
+    if sorted(state["appointment"]) != [0, 1]:
+        clauses.append(in_clause("is_appointment", state["appointment"]))
+
+    required_mask, required_set = presence_bits(state)
+    if required_mask != 0:
+        clauses.append(('"checkpoints_mask" & ? = ?', [required_mask, required_set]))
+
+    clauses.append(in_clause("gender", state["gender"]))
+    clauses.append(in_clause("final_status", state["final_status"]))
+    clauses.append(in_clause("clinic", state["clinics"]))
+    clauses.append(range_clause("age", *state["age"], True))
+    clauses.append(range_clause("start_hour", *state["start_time"], False))
+    clauses.append(range_clause("total_time", *state["total_time"], False))
+
+    # Visitors that do not have one of the checkpoints pass the rule
+    for start, end, min_time, max_time in state["btw"]:
+        start, end = quote(start), quote(end)
+        time_btw = f"abs({start} - {end}) / {float(NS_PER_HOUR)}"
+        clauses.append((f"({start} IS NULL OR {end} IS NULL OR ({time_btw} >= ? AND {time_btw} < ?))",
+                        [min_time, max_time]))
+
+    # Checkpoints are ordered if every pair of existing checkpoints is ordered, equal datetimes are ordered
+    if state["checkpoints"] is not None:
+        checkpoints = [quote(col) for col in state["checkpoints"]]
+        pairs = [f"({first} IS NULL OR {second} IS NULL OR {first} <= {second})"
+                 for index, first in enumerate(checkpoints) for second in checkpoints[index + 1:]]
+        ordered = " AND ".join(pairs) if pairs else "1"
+        clauses.append((f"({ordered})" if state["isOrdered"] == 1 else f"NOT ({ordered})", []))
+
+    return " AND ".join(f"({clause})" for clause, params in clauses), [param for clause, params in clauses for param in params]
+
+def count_visitors(dataset, state, session=None):
+    """
+    Count filtered visitors in database.
+    """
+
+    where, params = compile_state(state)
+
+    return execute(dataset, f"SELECT count(*) FROM visits WHERE {where}", params)[0][0]
+
+def query_positions(dataset, state, session=None):
+    """
+    Query row positions of filtered visitors in dataset["visits"] in order of rows.
+    """
+
+    where, params = compile_state(state)
+    rows = execute(dataset, f'SELECT "row" FROM visits WHERE {where} ORDER BY "row"', params)
+
+    return np.array([row for row, in rows], dtype=np.int64)
+
+def query_page(dataset, state, sort_by, page_current, page_size, session=None):
+    """
+    Query filtered visitors of current page sorted by columns of "data-table" sort_by property.
+    Return frame of page with columns of data_columns and number of filtered visitors.
+    Missing values are sorted last and equal values keep their order, like stable sorting in pandas.
+    """
+
+    where, params = compile_state(state)
+    order = [f'{quote(col["column_id"])} IS NULL, {quote(col["column_id"])} {"ASC" if col["direction"] == "asc" else "DESC"}'
+             for col in sort_by or []]
+
+    total = execute(dataset, f"SELECT count(*) FROM visits WHERE {where}", params)[0][0]
+
+    page_count = max(math.ceil(total / page_size), 1)
+    page_current = min(page_current or 0, page_count - 1)
+    columns = ", ".join(quote(col) for col in data_columns)
+    order_by = ", ".join(order + ['"row"'])
+    rows = execute(dataset, f"SELECT {columns} FROM visits WHERE {where} ORDER BY {order_by} LIMIT ? OFFSET ?",
+                   params + [page_size, page_current * page_size])
+
+    columns = dict()
+    for col, values in zip(data_columns, zip(*rows) if rows else [[]] * len(data_columns)):
+        if col.endswith("_dt"):
+            columns[col] = np.array([NAT if value is None else value for value in values], dtype=np.int64).view("datetime64[ns]")
+        else:
+            columns[col] = pd.Series(values, dtype=object)
+
+    return pd.DataFrame(columns), total
+
+if __name__ == "__main__":
+    import sys
+    from data_preprocessing import load_data
+
+    # Ingest workbook into the store and its database, e.g. python sql_backend.py ../data/sample-data-1-7Mar.xlsx
+    for filename in sys.argv[1:]:
+        dataset = attach_database(load_data(filename))
+        print(f"{filename}: {len(dataset['visits'])} visitors in {dataset['database']}")
@@ -0,0 +1,92 @@
+import argparse
+import numpy as np
+import pandas as pd
+from datetime import date, timedelta
+from data_preprocessing import data_columns, checkpoint_columns
+
+# Share of visitors that do not pass each checkpoint
+checkpoint_missing_rates = {"kios_g_dt": 0.7, "kios_dt": 0.1, "screen_dt": 0.15, "send_doc_dt": 0.2,
+                            "doc_call_dt": 0.25, "doc_begin_dt": 0.25, "doc_submit_dt": 0.3, "nurse_dt": 0.6,
+                            "payment_dt": 0.3, "pharmacy_dt": 0.45}
+
+# Mean minutes from the previous checkpoint to each checkpoint
+checkpoint_minutes = {"kios_g_dt": 5, "kios_dt": 10, "screen_dt": 20, "send_doc_dt": 10,
+                      "doc_call_dt": 60, "doc_begin_dt": 5, "doc_submit_dt": 15, "nurse_dt": 10,
+                      "payment_dt": 20, "pharmacy_dt": 30}
+
+# Clinic codes and names
+clinics = {f"C{index:02d}": f"Clinic {index:02d}" for index in range(1, 31)}
+
+final_statuses = ["Discharged", "Admitted", "Referred", "Cancelled", "Waiting"]
+
+def generate_day(day, visitors, seed=0):
+    """
+    Generate visitors of one day with the columns of data_columns.
+    Visits peak in the morning, about 40% are appointments on the hour or half hour, checkpoints follow each other
+    with random durations and are missing at checkpoint_missing_rates. A few visitors pass doctor begin checkpoint
+    before doctor call checkpoint or pass pharmacy checkpoint on the next day, like in real data.
+    """
+
+    rng = np.random.default_rng([seed, day.toordinal()])
+    midnight = pd.Timestamp(day)
+
+    hours = np.clip(rng.normal(9.5, 2.0, visitors), 6, 16)
+    visit_dt = pd.Series(midnight + pd.to_timedelta(np.round(hours * 3600), unit="s"))
+    is_appointment = rng.random(visitors) < 0.4
+    visit_dt = visit_dt.where(~is_appointment, visit_dt.dt.floor("30min"))
+
+    # Earlier clinics are up to twice as busy as later ones
+    weights = np.linspace(2, 1, len(clinics))
+    codes = rng.choice(list(clinics.keys()), visitors, p=weights / weights.sum())
+    columns = {
+        "vn": np.arange(visitors) + day.toordinal() % 10000 * 100000,
+        "gender": rng.choice(["M", "F"], visitors),
+        "age": np.clip(rng.normal(45, 20, visitors), 0, 100).astype(int),
+        "visit_dt": visit_dt,
+        "clinic_code": codes,
+        "clinic": [clinics[code] for code in codes],
+    }
+
+    current = visit_dt
+    for col in checkpoint_columns:
+        current = current + pd.to_timedelta(rng.exponential(checkpoint_minutes[col] * 60, visitors).round(), unit="s")
+        columns[col] = current.where(rng.random(visitors) >= checkpoint_missing_rates[col])
+
+    swapped = rng.random(visitors) < 0.05
+    columns["doc_begin_dt"] = columns["doc_begin_dt"].where(~swapped, columns["doc_begin_dt"] - pd.Timedelta(hours=1))
+    next_day = rng.random(visitors) < 0.005
+    columns["pharmacy_dt"] = columns["pharmacy_dt"].where(~next_day, columns["pharmacy_dt"] + pd.Timedelta(days=1))
+
+    columns["final_status"] = rng.choice(final_statuses, visitors, p=[0.8, 0.08, 0.04, 0.05, 0.03])
+
+    return pd.DataFrame(columns)[data_columns]
+
+def generate_days(start_date, days, visitors, seed=0):
+    """
+    Generate dictionary of date to visitors of the date for days from start date.
+    """
+
+    dates = [start_date + timedelta(days=offset) for offset in range(days)]
+
+    return {d: generate_day(d, visitors, seed) for d in dates}
+
+def write_workbook(filename, start_date, days, visitors, seed=0):
+    """
+    Write workbook with one sheet of generated visitors per day, like the source workbooks of load_data.
+    """
+
+    with pd.ExcelWriter(filename) as writer:
+        for offset in range(days):
+            day = start_date + timedelta(days=offset)
+            generate_day(day, visitors, seed).to_excel(writer, sheet_name=day.isoformat(), index=False)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate workbook of synthetic visitors.")
+    parser.add_argument("filename")
+    parser.add_argument("--start-date", type=date.fromisoformat, default=date(2021, 3, 1))
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--visitors", type=int, default=3000, help="visitors per day")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    write_workbook(args.filename, args.start_date, args.days, args.visitors, args.seed)
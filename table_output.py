@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+from functools import lru_cache
+from filter_engine import NAT
+
+# Format of datetime columns in "data-table" table
+datetime_format = "%d-%m-%Y%n%H:%M:%S"
+
+@lru_cache(maxsize=2 ** 16)
+def format_timestamp(value):
+    """
+    Format int64 nanosecond timestamp, formatted timestamps are cached across pages.
+    """
+
+    return pd.Timestamp(value).strftime(datetime_format)
+
+def format_datetimes(values):
+    """
+    Format datetime64 array into list of strings, NaT becomes None.
+    Each distinct timestamp is formatted only once.
+    """
+
+    unique, inverse = np.unique(values.astype("datetime64[ns]").view("int64"), return_inverse=True)
+    formatted = np.array([None if value == NAT else format_timestamp(value) for value in unique.tolist()], dtype=object)
+
+    return formatted[inverse].tolist()
+
+def table_records(page):
+    """
+    Generate "data-table" records from columns of page without building intermediate frames.
+    """
+
+    columns = dict()
+    for col in page.columns:
+        if col.endswith("_dt"):
+            columns[col] = format_datetimes(page[col].to_numpy())
+        else:
+            columns[col] = page[col].tolist()
+
+    return [dict(zip(columns.keys(), row)) for row in zip(*columns.values())]